@@ -1,15 +1,17 @@
 import sys
+from importlib import import_module
 
-from .commands import CollectCommand, DetectCommand, ImportCommand, ShellCommand
 from .commands.base_command import BaseCommand
 
 
 class Detector:  # pragma: no cover
     available_commands = {
-        "import": ImportCommand,
-        "detect": DetectCommand,
-        "collect": CollectCommand,
-        "shell": ShellCommand,
+        "import": "detector.commands.import_command.ImportCommand",
+        "detect": "detector.commands.detect_command.DetectCommand",
+        "collect": "detector.commands.collect_command.CollectCommand",
+        "backtest": "detector.commands.backtest_command.BacktestCommand",
+        "shell": "detector.commands.shell_command.ShellCommand",
+        "retention": "detector.commands.retention_command.RetentionCommand",
     }
 
     def execute(self) -> None:
@@ -22,8 +24,9 @@ class Detector:  # pragma: no cover
 
     def fetch_command(self, subcommand) -> BaseCommand:
         try:
-            command_cls = self.available_commands[subcommand]
+            command_path = self.available_commands[subcommand]
         except KeyError:
             sys.stderr.write("Unknown command: %r" % subcommand)
             sys.exit(1)
-        return command_cls()
+        module_name, class_name = command_path.rsplit(".", 1)
+        return getattr(import_module(module_name), class_name)()
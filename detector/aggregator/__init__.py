@@ -1 +1,3 @@
 from .aggregator import Aggregator
+from .frame_aggregator import FrameAggregator
+from .window_aggregator import WindowAggregator
@@ -1,6 +1,9 @@
+import abc
 from dataclasses import dataclass
-from typing import Callable
+from typing import Callable, ClassVar, Optional
 
+import numpy as np
+import pandas as pd
 from sqlalchemy import and_, case, func
 
 from detector.db import extract_time
@@ -10,20 +13,155 @@ from detector.db import extract_time
 class SimpleAggregation:
     func_name: str
     fields: tuple[str]
+    frame_funcs: ClassVar[dict[str, tuple[str, dict]]] = {
+        "avg": ("mean", {}),
+        "sum": ("sum", {"min_count": 1}),
+        "max": ("max", {}),
+        "min": ("min", {}),
+        "count": ("count", {}),
+    }
+
+    @property
+    def labels(self) -> list[str]:
+        return [f"{field}_{self.func_name}" for field in self.fields]
+
+    @property
+    def supports_frame(self) -> bool:
+        return self.func_name in self.frame_funcs
+
+    def sql(self, x) -> list:
+        return [
+            getattr(func, self.func_name)(getattr(x, field)).label(label)
+            for field, label in zip(self.fields, self.labels)
+        ]
+
+    def frame(self, x: pd.DataFrame, by: np.ndarray) -> dict[str, pd.Series]:
+        name, kwargs = self.frame_funcs[self.func_name]
+        return {label: getattr(x[field].groupby(by), name)(**kwargs) for field, label in zip(self.fields, self.labels)}
+
+
+class BaseAggregation(abc.ABC):
+    label: str
+    supports_frame: bool = True
+
+    @abc.abstractmethod
+    def sql(self, x):  # pragma: no cover
+        pass
+
+    @abc.abstractmethod
+    def frame(self, x: pd.DataFrame, by: np.ndarray) -> pd.Series:  # pragma: no cover
+        pass
 
 
 @dataclass
-class CustomAggregation:
+class CustomAggregation(BaseAggregation):
     label: str
     func: Callable
+    frame_func: Optional[Callable] = None
+
+    @property
+    def supports_frame(self) -> bool:
+        return self.frame_func is not None
+
+    def sql(self, x):
+        return self.func(x)
+
+    def frame(self, x: pd.DataFrame, by: np.ndarray) -> pd.Series:
+        return x.groupby(by).apply(self.frame_func)
+
+
+@dataclass
+class FilteredAverage(BaseAggregation):
+    label: str
+    field: str
+
+    def sql(self, x):
+        return func.avg(getattr(x, self.field)).filter(getattr(x, self.field) != 0)
+
+    def frame(self, x: pd.DataFrame, by: np.ndarray) -> pd.Series:
+        return x[self.field].where(x[self.field] != 0).groupby(by).mean()
+
+
+@dataclass
+class StatusCount(BaseAggregation):
+    label: str
+    status: str
+
+    def sql(self, x):
+        return func.count(x.status).filter(x.status.contains(self.status))
+
+    def frame(self, x: pd.DataFrame, by: np.ndarray) -> pd.Series:
+        return x.status.str.contains(self.status, regex=False, na=False).groupby(by).sum()
+
+
+@dataclass
+class UsernameCount(BaseAggregation):
+    label: str
+    username: str
+    prefix: bool = False
+
+    def sql(self, x):
+        return func.count(x.username).filter(
+            x.username.startswith(self.username) if self.prefix else x.username == self.username
+        )
+
+    def frame(self, x: pd.DataFrame, by: np.ndarray) -> pd.Series:
+        matches = x.username.str.startswith(self.username, na=False) if self.prefix else x.username == self.username
+        return matches.groupby(by).sum()
+
+
+@dataclass
+class TimeOfDay(BaseAggregation):
+    label: str
+    # Start hours of the parts of the day after the first one, the part index is the aggregated value.
+    bounds: tuple[int] = (6, 12, 18)
+
+    def sql(self, x):
+        starts = ["00:00:00"] + [f"{hour:02}:00:00" for hour in self.bounds]
+        return case(
+            [
+                (and_(extract_time(func.max(x.dttm)) >= start, extract_time(func.max(x.dttm)) < end), i)
+                for i, (start, end) in enumerate(zip(starts, starts[1:]))
+            ],
+            else_=len(self.bounds),
+        )
+
+    def frame(self, x: pd.DataFrame, by: np.ndarray) -> pd.Series:
+        hours = x.dttm.groupby(by).max().dt.hour
+        return pd.Series(np.searchsorted(self.bounds, hours, side="right"), index=hours.index).where(
+            hours.notna(), len(self.bounds)
+        )
 
 
 @dataclass
 class AggregationSetting:
     simple_agg: list[SimpleAggregation]
-    custom_agg: list[CustomAggregation]
+    custom_agg: list[BaseAggregation]
     qualitatives: list[str]
 
+    @property
+    def columns(self) -> list[str]:
+        return [label for simple_agg in self.simple_agg for label in simple_agg.labels] + [
+            custom_agg.label for custom_agg in self.custom_agg
+        ]
+
+    @property
+    def supports_frame(self) -> bool:
+        return all(aggregation.supports_frame for aggregation in self.simple_agg + self.custom_agg)
+
+    def sql(self, x) -> list:
+        return [column for simple_agg in self.simple_agg for column in simple_agg.sql(x)] + [
+            custom_agg.sql(x).label(custom_agg.label) for custom_agg in self.custom_agg
+        ]
+
+    def frame(self, x: pd.DataFrame, by: np.ndarray) -> pd.DataFrame:
+        columns = {}
+        for simple_agg in self.simple_agg:
+            columns.update(simple_agg.frame(x, by))
+        for custom_agg in self.custom_agg:
+            columns[custom_agg.label] = custom_agg.frame(x, by)
+        return pd.DataFrame(columns, columns=self.columns)
+
 
 AGGREGATION_SETTINGS = AggregationSetting(
     simple_agg=[
@@ -41,71 +179,16 @@ AGGREGATION_SETTINGS = AggregationSetting(
         ),
     ],
     custom_agg=[
-        CustomAggregation(
-            "connections_avg",
-            lambda x: func.avg(x.connections).filter(x.connections != 0),
-        ),
-        CustomAggregation(
-            "open_files_avg",
-            lambda x: func.avg(x.open_files).filter(x.open_files != 0),
-        ),
-        CustomAggregation(
-            "idle_status_count",
-            lambda x: func.count(x.status).filter(x.status.contains("idle")),
-        ),
-        CustomAggregation(
-            "sleeping_status_count",
-            lambda x: func.count(x.status).filter(x.status.contains("sleeping")),
-        ),
-        CustomAggregation(
-            "running_status_count",
-            lambda x: func.count(x.status).filter(x.status.contains("running")),
-        ),
-        CustomAggregation(
-            "zombie_status_count",
-            lambda x: func.count(x.status).filter(x.status.contains("zombie")),
-        ),
-        CustomAggregation(
-            "disk_sleep_status_count",
-            lambda x: func.count(x.status).filter(x.status.contains("disk_sleep")),
-        ),
-        CustomAggregation(
-            "root_processes_count",
-            lambda x: func.count(x.username).filter(x.username == "root"),
-        ),
-        CustomAggregation(
-            "system_processes_count",
-            lambda x: func.count(x.username).filter(x.username.startswith("sys")),
-        ),
-        CustomAggregation(
-            "time_of_day",
-            lambda x: case(
-                [
-                    (
-                        and_(
-                            extract_time(func.max(x.dttm)) >= "00:00:00",
-                            extract_time(func.max(x.dttm)) < "06:00:00",
-                        ),
-                        0,
-                    ),
-                    (
-                        and_(
-                            extract_time(func.max(x.dttm)) >= "06:00:00",
-                            extract_time(func.max(x.dttm)) < "12:00:00",
-                        ),
-                        1,
-                    ),
-                    (
-                        and_(
-                            extract_time(func.max(x.dttm)) >= "12:00:00",
-                            extract_time(func.max(x.dttm)) < "18:00:00",
-                        ),
-                        2,
-                    ),
-                ],
-                else_=3,
-            ),
-        ),
+        FilteredAverage("connections_avg", "connections"),
+        FilteredAverage("open_files_avg", "open_files"),
+        StatusCount("idle_status_count", "idle"),
+        StatusCount("sleeping_status_count", "sleeping"),
+        StatusCount("running_status_count", "running"),
+        StatusCount("zombie_status_count", "zombie"),
+        StatusCount("disk_sleep_status_count", "disk_sleep"),
+        UsernameCount("root_processes_count", "root"),
+        UsernameCount("system_processes_count", "sys", prefix=True),
+        TimeOfDay("time_of_day"),
     ],
     qualitatives=["time_of_day"],
 )
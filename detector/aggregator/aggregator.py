@@ -1,64 +1,249 @@
 from datetime import datetime, timedelta
-from typing import Type
+from hashlib import sha256
+from typing import Iterator, Optional, Type
 
 import pandas as pd
-from sqlalchemy import distinct, func
+from sqlalchemy import DateTime, Float, and_, cast, distinct, func, literal, select, union_all
 from sqlalchemy.orm import Query, Session
 
-from detector.db import BaseRawValue, RawCleanedValue, RawValue, session_scope, string_agg
+from detector.db import AggregatedWindow, BaseRawValue, RawCleanedValue, RawValue, session_scope, string_agg
 
 from .aggregation_settings import AGGREGATION_SETTINGS, AggregationSetting
+from .frame_aggregator import AVERAGE_FIELDS, aggregate_windows, get_partials
 
 
 class Aggregator:
     period_length = 10
+    # Windows are computed by batches. Aggregations without a pandas engine pass the windows to the database
+    # as a UNION ALL of literal rows, SQLite allows at most 500 of them.
+    windows_batch_size = 400
     aggregation_settings: AggregationSetting = AGGREGATION_SETTINGS
+    _settings_hashes: dict[Type[BaseRawValue], tuple[int, AggregationSetting, str]]
+
+    def __init__(self) -> None:
+        self._settings_hashes = {}
 
     def get_train_data(self) -> pd.DataFrame:
+        self.refresh_windows(RawCleanedValue)
+        return self.load_windows(RawCleanedValue).reset_index(drop=True)
+
+    def iter_train_data(self, chunk_size: int = 1000) -> Iterator[pd.DataFrame]:
+        self.refresh_windows(RawCleanedValue)
+        dttm_from = None
+        while True:
+            windows = self.load_windows(RawCleanedValue, dttm_from=dttm_from, limit=chunk_size, include_from=False)
+            if windows.empty:
+                return
+            dttm_from = windows.index[-1]
+            yield windows.reset_index(drop=True)
+
+    def settings_hash(self, raw_value_cls: Type[BaseRawValue]) -> str:
+        # The compiled windows query covers the aggregations, the source table and the query itself,
+        # so materialized windows are recomputed whenever any of them changes. The hash is compiled once
+        # until the period or the aggregation settings of the aggregator are replaced.
+        period_length, aggregation_settings, settings_hash = self._settings_hashes.get(
+            raw_value_cls, (None, None, None)
+        )
+        if period_length == self.period_length and aggregation_settings is self.aggregation_settings:
+            return settings_hash
         with session_scope() as session:
-            dttms = list(
-                map(
-                    lambda x: x["unique_dttm"],
-                    session.query(distinct(RawCleanedValue.dttm).label("unique_dttm")).order_by("unique_dttm").all(),
+            query = self._get_windows_query([datetime(2000, 1, 1)], session, raw_value_cls)
+            settings_hash = sha256(
+                f"{self.period_length}:{self.aggregation_settings.supports_frame}:{query.statement}".encode()
+            ).hexdigest()
+        self._settings_hashes[raw_value_cls] = (self.period_length, self.aggregation_settings, settings_hash)
+        return settings_hash
+
+    def refresh_windows(self, raw_value_cls: Type[BaseRawValue]) -> int:
+        settings_hash = self.settings_hash(raw_value_cls)
+        with session_scope() as session:
+            last_window = (
+                session.query(AggregatedWindow.dttm, AggregatedWindow.raw_max_id)
+                .filter(AggregatedWindow.settings_hash == settings_hash)
+                .order_by(AggregatedWindow.dttm.desc())
+                .first()
+            )
+            # Raw values added up to the last window after it was computed have greater ids, then all windows
+            # of the settings are recomputed. Removed raw values, like the ones rolled up by retention, do not
+            # change the stored windows.
+            if last_window is not None and (
+                last_window.raw_max_id is None
+                or session.query(raw_value_cls.id)
+                .filter(raw_value_cls.id > last_window.raw_max_id, raw_value_cls.dttm <= last_window.dttm)
+                .first()
+                is not None
+            ):
+                session.query(AggregatedWindow).filter(AggregatedWindow.settings_hash == settings_hash).delete(
+                    synchronize_session=False
+                )
+                last_window = None
+            # Taken before the windows are computed, a value added meanwhile is only recomputed once more.
+            raw_max_id = session.query(func.max(raw_value_cls.id)).scalar()
+        dttms = self.get_dttms(raw_value_cls)
+        if last_window is not None:
+            dttms = [dttm for dttm in dttms if dttm > last_window.dttm]
+
+        # Windows only depend on older raw values, so only the ones newer than the last materialized window
+        # are computed. Every batch is committed separately, an interrupted refresh continues from it.
+        for windows in self._iter_windows(dttms, raw_value_cls):
+            windows = windows.apply(pd.to_numeric).astype(object).where(windows.notna(), None)
+            with session_scope() as session:
+                session.bulk_insert_mappings(
+                    AggregatedWindow,
+                    [
+                        {"settings_hash": settings_hash, "dttm": dttm, "features": features, "raw_max_id": raw_max_id}
+                        for dttm, features in zip(windows.index, windows.to_dict("records"))
+                    ],
                 )
+        return len(dttms)
+
+    def load_windows(
+        self,
+        raw_value_cls: Type[BaseRawValue],
+        dttm_from: Optional[datetime] = None,
+        dttm_to: Optional[datetime] = None,
+        limit: Optional[int] = None,
+        include_from=True,
+    ) -> pd.DataFrame:
+        with session_scope() as session:
+            qs = session.query(AggregatedWindow.dttm, AggregatedWindow.features).filter(
+                AggregatedWindow.settings_hash == self.settings_hash(raw_value_cls)
             )
-            return pd.DataFrame(
-                [
-                    self._get_aggregate_query(dttm, session, RawCleanedValue).first()
-                    for dttm in dttms[self.period_length :]  # noqa: E203
-                ]
+            if dttm_from is not None:
+                qs = qs.filter(
+                    AggregatedWindow.dttm >= dttm_from if include_from else AggregatedWindow.dttm > dttm_from
+                )
+            if dttm_to is not None:
+                qs = qs.filter(AggregatedWindow.dttm <= dttm_to)
+            rows = qs.order_by(AggregatedWindow.dttm).limit(limit).all()
+        return pd.DataFrame(
+            [features for _, features in rows],
+            index=pd.Index([dttm for dttm, _ in rows], name="dttm"),
+            columns=self._columns,
+        )
+
+    def get_dttms(
+        self,
+        raw_value_cls: Type[BaseRawValue],
+        dttm_from: Optional[datetime] = None,
+        dttm_to: Optional[datetime] = None,
+    ) -> list[datetime]:
+        with session_scope() as session:
+            qs = session.query(distinct(raw_value_cls.dttm).label("unique_dttm"))
+            if dttm_to is not None:
+                qs = qs.filter(raw_value_cls.dttm <= dttm_to)
+            dttms = [row["unique_dttm"] for row in qs.order_by("unique_dttm").all()]
+        dttms = dttms[self.period_length :]  # noqa: E203
+        if dttm_from is not None:
+            dttms = [dttm for dttm in dttms if dttm >= dttm_from]
+        return dttms
+
+    def get_windows(self, dttms: list[datetime], raw_value_cls: Type[BaseRawValue]) -> pd.DataFrame:
+        index = pd.Index(dttms, name="dttm")
+        if not dttms:
+            return pd.DataFrame(columns=self._columns, index=index)
+        return pd.concat(self._iter_windows(sorted(set(dttms)), raw_value_cls)).reindex(index)
+
+    def _iter_windows(self, dttms: list[datetime], raw_value_cls: Type[BaseRawValue]) -> Iterator[pd.DataFrame]:
+        # Windows of the sorted dttms by batches. With pandas aggregations raw values are read once: every batch
+        # reads the values newer than the previous one, turns them into per snapshot and process partials and keeps
+        # the partials of the last period for the next batch.
+        period = timedelta(minutes=self.period_length) - timedelta(seconds=2)
+        partials, read_to = None, None
+        for i in range(0, len(dttms), self.windows_batch_size):
+            batch = dttms[i : i + self.windows_batch_size]  # noqa: E203
+            if not self.aggregation_settings.supports_frame:
+                with session_scope() as session:
+                    windows = pd.DataFrame(
+                        self._get_windows_query(batch, session, raw_value_cls).all(),
+                        columns=["window_dttm"] + self._columns,
+                    )
+                yield windows.set_index("window_dttm").reindex(pd.Index(batch, name="dttm"))
+                continue
+
+            dttm_from = batch[0] - period
+            read_from = dttm_from if read_to is None else max(read_to, dttm_from)
+            new_partials = get_partials(
+                self._read_raw_values(raw_value_cls, read_from, batch[-1]), ["dttm", "pid", "username"]
+            ).reset_index()
+            if partials is not None:
+                new_partials = pd.concat([partials[partials.dttm > dttm_from], new_partials], ignore_index=True)
+            partials, read_to = new_partials.fillna(0), batch[-1]
+            yield aggregate_windows(partials, batch, self.period_length, self.aggregation_settings)
+
+    def _read_raw_values(
+        self, raw_value_cls: Type[BaseRawValue], dttm_from: datetime, dttm_to: datetime
+    ) -> pd.DataFrame:
+        columns = ["dttm", "pid", "username", "status"] + AVERAGE_FIELDS
+        with session_scope() as session:
+            rows = (
+                session.query(*[getattr(raw_value_cls, column) for column in columns])
+                .filter(raw_value_cls.dttm > dttm_from, raw_value_cls.dttm <= dttm_to)
+                .all()
             )
+        return pd.DataFrame(rows, columns=columns)
+
+    @property
+    def _columns(self) -> list[str]:
+        return self.aggregation_settings.columns
+
+    def _get_windows_query(self, dttms: list[datetime], session: Session, raw_value_cls: Type[BaseRawValue]) -> Query:
+        # Raw values are aggregated once per process and snapshot, each window then only combines the partial
+        # sums and counts of the snapshots it covers. All windows of the batch are computed by one statement,
+        # it is used for aggregations without a pandas engine.
+        period = timedelta(minutes=self.period_length) - timedelta(seconds=2)
+        windows = union_all(
+            *[
+                select(
+                    literal(dttm, DateTime).label("window_dttm"), literal(dttm - period, DateTime).label("dttm_from")
+                )
+                for dttm in dttms
+            ]
+        ).cte("windows")
 
-    def _get_aggregate_query(self, dttm: datetime, session: Session, raw_value_cls: Type[BaseRawValue]) -> Query:
-        dttm_from = dttm - timedelta(minutes=self.period_length) + timedelta(seconds=2)
-        dttm_to = dttm
         average_fields = ["cpu_percent", "memory_percent", "num_threads", "connections", "open_files"]
-        groupped_processes_qs = (
+        snapshots_qs = (
             session.query(
+                raw_value_cls.pid,
                 raw_value_cls.username,
-                *[func.avg(getattr(raw_value_cls, field)).label(field) for field in average_fields],
-                func.max(raw_value_cls.dttm).label("dttm"),
+                raw_value_cls.dttm,
+                *[func.sum(getattr(raw_value_cls, field)).label(f"{field}_sum") for field in average_fields],
+                *[func.count(getattr(raw_value_cls, field)).label(f"{field}_count") for field in average_fields],
                 string_agg(raw_value_cls.status).label("status"),
             )
             .filter(
-                raw_value_cls.dttm > dttm_from,
-                raw_value_cls.dttm <= dttm_to,
+                raw_value_cls.dttm > min(dttms) - period,
+                raw_value_cls.dttm <= max(dttms),
             )
-            .group_by(raw_value_cls.pid, raw_value_cls.username)
+            .group_by(raw_value_cls.pid, raw_value_cls.username, raw_value_cls.dttm)
             .subquery()
         )
-        aggregation_settings = [
-            getattr(func, simple_agg.func_name)(getattr(groupped_processes_qs.c, field)).label(
-                f"{field}_{simple_agg.func_name}"
+        groupped_processes_qs = (
+            session.query(
+                windows.c.window_dttm,
+                snapshots_qs.c.username,
+                *[
+                    (
+                        cast(func.sum(getattr(snapshots_qs.c, f"{field}_sum")), Float)
+                        / func.nullif(func.sum(getattr(snapshots_qs.c, f"{field}_count")), 0)
+                    ).label(field)
+                    for field in average_fields
+                ],
+                func.max(snapshots_qs.c.dttm).label("dttm"),
+                string_agg(snapshots_qs.c.status).label("status"),
             )
-            for simple_agg in self.aggregation_settings.simple_agg
-            for field in simple_agg.fields
-        ] + [
-            custom_agg.func(groupped_processes_qs.c).label(custom_agg.label)
-            for custom_agg in self.aggregation_settings.custom_agg
-        ]
-        return session.query(*aggregation_settings)
+            .select_from(windows)
+            .join(
+                snapshots_qs,
+                and_(snapshots_qs.c.dttm > windows.c.dttm_from, snapshots_qs.c.dttm <= windows.c.window_dttm),
+            )
+            .group_by(windows.c.window_dttm, snapshots_qs.c.pid, snapshots_qs.c.username)
+            .subquery()
+        )
+        aggregation_settings = self.aggregation_settings.sql(groupped_processes_qs.c)
+        return session.query(groupped_processes_qs.c.window_dttm, *aggregation_settings).group_by(
+            groupped_processes_qs.c.window_dttm
+        )
 
     def get_detect_data(self, dttm: datetime) -> pd.DataFrame:
-        with session_scope() as session:
-            return pd.DataFrame(self._get_aggregate_query(dttm, session, RawValue).all())
+        return self.get_windows([dttm], RawValue).reset_index(drop=True)
@@ -0,0 +1,146 @@
+from datetime import datetime, timedelta
+from functools import cached_property
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from detector.data_getter.process_getter import COLUMNS
+
+from .aggregation_settings import AGGREGATION_SETTINGS, AggregationSetting
+
+AVERAGE_FIELDS = ["cpu_percent", "memory_percent", "num_threads", "connections", "open_files"]
+STATUS_PREFIX = "status:"
+
+
+def get_partials(data: pd.DataFrame, keys: list[str]) -> pd.DataFrame:
+    # Sums, counts and statuses of the rows of every key, the windows are aggregated from them.
+    data = data.assign(snapshots=1, **{f"{field}_count": data[field].notna() for field in AVERAGE_FIELDS})
+    partials = data.groupby(keys).agg(
+        {
+            **{field: "sum" for field in AVERAGE_FIELDS},
+            **{f"{field}_count": "sum" for field in AVERAGE_FIELDS},
+            "snapshots": "max",
+        }
+    )
+    statuses = pd.crosstab([data[key] for key in keys], data.status)
+    return partials.join(statuses.add_prefix(STATUS_PREFIX)).fillna(0).astype(float)
+
+
+def get_processes(totals: pd.DataFrame, last_seen: pd.Series) -> pd.DataFrame:
+    # The same columns as the per-process subquery of Aggregator: field averages, last dttm and joined statuses.
+    processes = pd.DataFrame(
+        {
+            field: totals[field] / totals[f"{field}_count"].where(totals[f"{field}_count"] > 0)
+            for field in AVERAGE_FIELDS
+        },
+        index=totals.index,
+    )
+    processes["dttm"] = last_seen
+    status = np.full(len(totals), "", dtype=object)
+    for column in totals.columns:
+        if column.startswith(STATUS_PREFIX):
+            status = status + np.where(totals[column].to_numpy() > 0, column[len(STATUS_PREFIX) :] + ",", "")  # noqa
+    processes["status"] = [value[:-1] for value in status]
+    return processes.reset_index()
+
+
+def get_window_processes(partials: pd.DataFrame, windows: np.ndarray, period: np.timedelta64) -> pd.DataFrame:
+    # Totals of every process in every sorted window. A window of a process covers a contiguous range of its
+    # snapshots, so the totals are differences of cumulative sums at the range bounds and every partial is summed
+    # once, however many windows cover it.
+    keys = ["pid", "username"]
+    if len(windows):
+        partials = partials[(partials.dttm > windows[0] - period) & (partials.dttm <= windows[-1])]
+    if partials.empty or not len(windows):
+        return get_processes(partials.set_index(["dttm"] + keys).rename_axis(["window"] + keys), partials.dttm)
+    partials = partials.sort_values(keys + ["dttm"], kind="stable").reset_index(drop=True)
+    values = partials.drop(columns=["dttm"] + keys).astype(float)
+    groups = partials.groupby(keys, sort=False).ngroup().to_numpy()
+    snapshot_dttms = partials.dttm.to_numpy(dtype="datetime64[ns]")
+
+    # Every snapshot is in the windows ending in [dttm, dttm + period). The windows of a process are opened by
+    # its first snapshot in them, the ones already covered by its previous snapshot are skipped.
+    first = np.searchsorted(windows, snapshot_dttms, side="left")
+    last = np.searchsorted(windows, snapshot_dttms + period, side="left")
+    group_starts = np.r_[True, groups[1:] != groups[:-1]]
+    opened_from = np.where(group_starts, first, np.maximum(first, np.r_[0, last[:-1]]))
+    counts = np.maximum(last - opened_from, 0)
+    starts = np.repeat(np.arange(len(partials)), counts)
+    positions = opened_from[starts] + np.arange(len(starts)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    # The range ends at the last snapshot of the process not newer than the window. A snapshot is not newer than
+    # the window at a position when its first window is not after it, so (group, first) is sorted and searched.
+    bounds = groups * (len(windows) + 1) + first
+    ends = np.searchsorted(bounds, groups[starts] * (len(windows) + 1) + positions, side="right") - 1
+
+    cumulative = values.groupby(groups).cumsum().to_numpy()
+    totals = pd.DataFrame(
+        cumulative[ends] - cumulative[starts] + values.to_numpy()[starts],
+        columns=values.columns,
+        index=pd.MultiIndex.from_arrays(
+            [positions, partials.pid.to_numpy()[starts], partials.username.to_numpy()[starts]], names=["window"] + keys
+        ),
+    )
+    return get_processes(totals, pd.Series(snapshot_dttms[ends], index=totals.index))
+
+
+def aggregate_windows(
+    partials: pd.DataFrame, dttms: list[datetime], period_length: int, aggregation_settings: AggregationSetting
+) -> pd.DataFrame:
+    index = pd.Index(dttms, name="dttm")
+    windows = np.unique(np.asarray(dttms, dtype="datetime64[ns]"))
+    period = np.timedelta64(timedelta(minutes=period_length) - timedelta(seconds=2))
+    processes = get_window_processes(partials, windows, period)
+    result = aggregation_settings.frame(processes, processes.window.to_numpy())
+    result = result.reindex(np.arange(len(windows)))
+    result.index = pd.Index(windows, name="dttm")
+    return result.reindex(index)
+
+
+class FrameAggregator:
+    period_length = 10
+    aggregation_settings: AggregationSetting = AGGREGATION_SETTINGS
+    _data: pd.DataFrame
+
+    def __init__(self, data: pd.DataFrame) -> None:
+        self._data = data
+
+    @classmethod
+    def from_csv(cls, filename: str) -> "FrameAggregator":
+        data = pd.read_csv(filename, names=COLUMNS)
+        data.dttm = pd.to_datetime(data.dttm, unit="s")
+        return cls(data)
+
+    @classmethod
+    def from_parquet(
+        cls, directory: str, dttm_from: Optional[datetime] = None, dttm_to: Optional[datetime] = None
+    ) -> "FrameAggregator":
+        from detector.collectors.parquet_collector import read_segments
+
+        columns = ["dttm", "pid", "username", "status"] + AVERAGE_FIELDS
+        return cls(pd.concat(read_segments(directory, columns, dttm_from, dttm_to), ignore_index=True))
+
+    @cached_property
+    def _partials(self) -> pd.DataFrame:
+        return get_partials(self._data, ["dttm", "pid", "username"]).reset_index().sort_values("dttm", kind="stable")
+
+    def get_dttms(self, dttm_from: Optional[datetime] = None, dttm_to: Optional[datetime] = None) -> list[datetime]:
+        dttms = pd.Series(self._partials.dttm.unique())
+        if dttm_to is not None:
+            dttms = dttms[dttms <= dttm_to]
+        dttms = dttms.iloc[self.period_length :]  # noqa: E203
+        if dttm_from is not None:
+            dttms = dttms[dttms >= dttm_from]
+        return [dttm.to_pydatetime() for dttm in dttms]
+
+    def get_windows(self, dttms: list[datetime]) -> pd.DataFrame:
+        return aggregate_windows(self._partials, dttms, self.period_length, self.aggregation_settings)
+
+    def get_train_data(self) -> pd.DataFrame:
+        return self.get_windows(self.get_dttms()).reset_index(drop=True)
+
+    def iter_train_data(self, chunk_size: int = 1000) -> Iterator[pd.DataFrame]:
+        dttms = self.get_dttms()
+        for i in range(0, len(dttms), chunk_size):
+            yield self.get_windows(dttms[i : i + chunk_size]).reset_index(drop=True)  # noqa: E203
@@ -0,0 +1,55 @@
+from collections import deque
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from .aggregation_settings import AGGREGATION_SETTINGS, AggregationSetting
+from .frame_aggregator import get_partials, get_processes
+
+
+class WindowAggregator:
+    period_length = 10
+    aggregation_settings: AggregationSetting = AGGREGATION_SETTINGS
+    _snapshots: deque[tuple[datetime, pd.DataFrame]]
+    _totals: pd.DataFrame
+    _last_seen: pd.Series
+    _pushed: int = 0
+
+    def __init__(self) -> None:
+        self._snapshots = deque()
+        self._totals = pd.DataFrame()
+        self._last_seen = pd.Series(dtype="datetime64[ns]")
+
+    @property
+    def supported(self) -> bool:
+        return self.aggregation_settings.supports_frame
+
+    def __len__(self) -> int:
+        return len(self._snapshots)
+
+    def push(self, dttm: datetime, data: pd.DataFrame) -> None:
+        partials = get_partials(data, ["pid", "username"])
+        self._snapshots.append((dttm, partials))
+        self._totals = partials if self._totals.empty else self._totals.add(partials, fill_value=0)
+        self._last_seen = pd.Series(pd.Timestamp(dttm), index=partials.index).combine_first(self._last_seen)
+
+        # The same bounds as the aggregate query: snapshots newer than period_length minutes minus two seconds.
+        dttm_from = dttm - timedelta(minutes=self.period_length) + timedelta(seconds=2)
+        while self._snapshots[0][0] <= dttm_from:
+            _, evicted = self._snapshots.popleft()
+            self._totals = self._totals.sub(evicted, fill_value=0)
+        self._pushed += 1
+        if self._pushed % self.period_length == 0:
+            # Running float sums drift after many additions and subtractions, so they are recomputed from time to time.
+            self._totals = pd.concat([partials for _, partials in self._snapshots]).groupby(level=[0, 1]).sum()
+
+        self._totals = self._totals[self._totals.snapshots > 0]
+        self._last_seen = self._last_seen.reindex(self._totals.index)
+
+    def get_processes(self) -> pd.DataFrame:
+        return get_processes(self._totals, self._last_seen)
+
+    def get_detect_data(self) -> pd.DataFrame:
+        processes = self.get_processes()
+        return self.aggregation_settings.frame(processes, np.zeros(len(processes), dtype=int)).reindex([0])
@@ -1,5 +1,6 @@
 import json
-from typing import Any, Union
+from functools import cached_property
+from typing import Any, Callable, Iterable, Optional, Union
 
 import numpy as np
 import pandas as pd
@@ -7,16 +8,18 @@ import pandas as pd
 from detector.aggregator.aggregation_settings import AGGREGATION_SETTINGS
 from detector.settings import MAX_DISTANCE
 
+from .binary_model import is_binary_model, load_binary_model, save_binary_model
 from .exceptions import AnomalyException
 from .splits import SplitsCollection
-from .states import State, StatesCollection
+from .states import State, StatesCollection, StatesMoments
 from .utils import json_default
 
 
 class AnomalyDetector:
     _splits: SplitsCollection
     _normal_states: StatesCollection
-    _groups: dict[tuple[int], int]
+    _moments: StatesMoments
+    _clear_anomalies: bool = True
     _qualitatives: list[str]
 
     def __init__(self, qualitatives: list[str] = None) -> None:
@@ -24,43 +27,56 @@ class AnomalyDetector:
             qualitatives = AGGREGATION_SETTINGS.qualitatives
         self._qualitatives = qualitatives
 
-    def fit(self, data: pd.DataFrame, clear_anomalies=True) -> None:
+    def fit(self, data: pd.DataFrame, clear_anomalies=True, workers: Optional[int] = None) -> None:
         df = self._clean_df(data)
-        self._splits = SplitsCollection.build(df, qualitatives=self._qualitatives)
-        normal_states = pd.DataFrame(
-            columns=self._columns,
-            data=list(df.apply(self._encode, axis=1)),
+        self._splits = SplitsCollection.build(df, qualitatives=self._qualitatives, workers=workers)
+        self._moments = StatesMoments.from_data(df, self._splits)
+        self._clear_anomalies = clear_anomalies
+        self._normal_states = self._moments.to_states(self._moments.select(clear_anomalies))
+        self.__dict__.pop("_groups", None)
+
+    def fit_stream(
+        self,
+        chunks: Callable[[], Iterable[pd.DataFrame]],
+        clear_anomalies=True,
+        workers: Optional[int] = None,
+        sample_size: int = 100_000,
+    ) -> None:
+        # chunks is called twice: the first stream builds the splits, the second one accumulates states moments.
+        # No chunk is kept between them, so memory does not grow with the length of the history.
+        self._splits = SplitsCollection.build_from_chunks(
+            map(self._clean_df, chunks()), qualitatives=self._qualitatives, workers=workers, sample_size=sample_size
         )
-        cols = list(normal_states.columns)
-        total_rows = len(normal_states)
-        normal_states = normal_states.sort_values(cols)
-        normal_states["group"] = "g" + (normal_states.groupby(cols).ngroup() + 1).astype(str)
-        normal_states_groupped = (
-            normal_states.groupby("group")[cols[0]]
-            .count()
-            .apply(lambda x: x / total_rows)
-            .sort_values(ascending=False)
-            .reset_index()
-            .rename({cols[0]: "density"}, axis=1)
-        )
-        total_percent = 0
-        groups = []
-        for _, row in normal_states_groupped.iterrows():
-            total_percent += row.density
-            groups.append(row.group)
-            if total_percent > 0.89 and clear_anomalies:
-                break
-
-        self._normal_states = StatesCollection.build(
-            set(map(tuple, normal_states[normal_states.group.isin(groups)][cols].values)), df, self._splits
-        )
-        self._groups = {state: i + 1 for i, state in enumerate(self._normal_states)}
+        moments = None
+        for chunk in map(self._clean_df, chunks()):
+            if chunk.empty:
+                continue
+            chunk_moments = StatesMoments.from_data(chunk, self._splits)
+            moments = chunk_moments if moments is None else moments.merge(chunk_moments)
+        if moments is None:
+            raise ValueError("There is no data to fit.")
+        self._moments = moments
+        self._clear_anomalies = clear_anomalies
+        self._normal_states = self._moments.to_states(self._moments.select(clear_anomalies))
+        self.__dict__.pop("_groups", None)
+
+    def partial_fit(self, data: pd.DataFrame) -> None:
+        if not hasattr(self, "_moments"):
+            raise ValueError('You should call "fit" or load a model saved after "fit" first.')
+        self._moments = self._moments.merge(StatesMoments.from_data(self._clean_df(data), self._splits))
+        self._normal_states = self._moments.to_states(self._moments.select(self._clear_anomalies))
+        self.__dict__.pop("_groups", None)
+
+    @cached_property
+    def _groups(self) -> dict[tuple[int], int]:
+        return {state: i + 1 for i, state in enumerate(self._normal_states)}
 
     def classify(self, data: pd.DataFrame) -> pd.DataFrame:
-        if not hasattr(self, "_groups") or not hasattr(self, "_splits"):
+        if not hasattr(self, "_normal_states") or not hasattr(self, "_splits"):
             raise ValueError('You should call "fit" or "load_model" first.')
         data = data.copy()
-        data["label"] = data.apply(lambda x: self._groups.get(self._encode(x), "anomaly"), axis=1)
+        encoded, _ = self._encode_batch(data)
+        data["label"] = [self._groups.get(tuple(state), "anomaly") for state in encoded]
 
         return data
 
@@ -71,19 +87,36 @@ class AnomalyDetector:
         )
         return df.astype(dict([(field, float) for field in float_columns])).round(6)
 
-    def save_model(self, path: str) -> None:
+    def save_model(self, path: str, binary=False) -> None:
+        moments = getattr(self, "_moments", None)
+        if binary:
+            save_binary_model(path, self._splits, self._normal_states, moments, self._clear_anomalies)
+            return
+
         data = {
             "splits": self._splits,
             "normal_states": self._normal_states,
         }
+        if moments is not None:
+            data["moments"] = moments
+            data["clear_anomalies"] = self._clear_anomalies
         with open(path, "w") as file:
             file.write(json.dumps(data, default=json_default))
 
     def load_model(self, path: str) -> None:
-        with open(path) as file:
-            data = json.loads(file.read())
-        self._splits = SplitsCollection.load_from_dict(data["splits"])
-        self._normal_states = StatesCollection.from_dict(data["normal_states"], splits=self._splits)
+        self.__dict__.pop("_groups", None)
+        self.__dict__.pop("_moments", None)
+        if is_binary_model(path):
+            self._splits, self._normal_states, moments, self._clear_anomalies = load_binary_model(path)
+        else:
+            with open(path) as file:
+                data = json.loads(file.read())
+            self._splits = SplitsCollection.load_from_dict(data["splits"])
+            self._normal_states = StatesCollection.from_dict(data["normal_states"], splits=self._splits)
+            moments = StatesMoments.from_dict(data["moments"], self._splits) if "moments" in data else None
+            self._clear_anomalies = data.get("clear_anomalies", True)
+        if moments is not None:
+            self._moments = moments
 
     def detect(
         self, data: pd.DataFrame, raise_exception=True, find_closest_states=True, max_difference_to_skip=None
@@ -95,31 +128,32 @@ class AnomalyDetector:
 
         dict_data = data.to_dict("index")
 
-        for i, state in data.iterrows():
-            if state not in self._normal_states:
-                state, has_out_of_range = self._encode(data.loc[i], return_out_of_range=True)
-                if (
-                    not has_out_of_range
-                    and max_difference_to_skip is not None
-                    and self._normal_states.closest_states(state, max_distance=max_difference_to_skip)
-                ):
-                    continue
-                anomalies.append(
-                    {
-                        "index": i,
-                        "aggregated": dict_data[i],
-                        "closest_states": list(
-                            self._normal_states.closest_states_with_fields_differ(
-                                state,
-                                max_distance=MAX_DISTANCE,
-                                ignore_zero_difference=has_out_of_range,
-                            ).values()
-                        )
-                        if find_closest_states
-                        else [],
-                        "out_of_range": has_out_of_range,
-                    }
-                )
+        positions = np.flatnonzero(~self._normal_states.contains(data))
+        encoded, out_of_range = self._encode_batch(data.iloc[positions])
+
+        for i, state, has_out_of_range in zip(data.index[positions], map(tuple, encoded), map(bool, out_of_range)):
+            if (
+                not has_out_of_range
+                and max_difference_to_skip is not None
+                and self._normal_states.closest_states(state, max_distance=max_difference_to_skip)
+            ):
+                continue
+            anomalies.append(
+                {
+                    "index": i,
+                    "aggregated": dict_data[i],
+                    "closest_states": list(
+                        self._normal_states.closest_states_with_fields_differ(
+                            state,
+                            max_distance=MAX_DISTANCE,
+                            ignore_zero_difference=has_out_of_range,
+                        ).values()
+                    )
+                    if find_closest_states
+                    else [],
+                    "out_of_range": has_out_of_range,
+                }
+            )
 
         if anomalies and raise_exception:
             raise AnomalyException(anomalies)
@@ -147,6 +181,9 @@ class AnomalyDetector:
         else:
             return tuple(new_row), has_out_of_range
 
+    def _encode_batch(self, data: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+        return self._splits.encode(data)
+
     def get_closest_states(self, state: Union[tuple[int], State], max_distance=3) -> StatesCollection:
         return self._normal_states.closest_states(state, max_distance=max_distance)
 
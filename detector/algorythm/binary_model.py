@@ -0,0 +1,140 @@
+import json
+import mmap
+import struct
+from typing import Optional
+
+import numpy as np
+
+from .splits import QualitativeSplit, QuantitativeSplit, SplitsCollection
+from .states import StatesCollection, StatesMoments
+
+# Layout: MAGIC, version and header length as little-endian uint32, JSON header, then the
+# arrays described by the header, each aligned to ALIGNMENT bytes from the start of the file.
+MAGIC = b"PADMODEL"
+VERSION = 1
+ALIGNMENT = 64
+_PREFIX = struct.Struct("<8sII")
+
+
+def is_binary_model(path: str) -> bool:
+    with open(path, "rb") as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def save_binary_model(
+    path: str,
+    splits: SplitsCollection,
+    states: StatesCollection,
+    moments: Optional[StatesMoments] = None,
+    clear_anomalies=True,
+) -> None:
+    quantitative = [split for split in splits if not isinstance(split, QualitativeSplit)]
+    states = list(states)
+
+    arrays = {
+        "edges": np.array([edge for split in quantitative for edge in split.splits], dtype="<f8").reshape(-1, 2),
+        "state_positions": np.array(
+            [splits.positions_from_state(state.state) for state in states], dtype="<i4"
+        ).reshape(len(states), len(splits)),
+        "means": np.zeros((len(states), len(quantitative)), dtype="<f8"),
+        "stds": np.zeros((len(states), len(quantitative)), dtype="<f8"),
+    }
+    quantitative_positions = {split.field: i for i, split in enumerate(quantitative)}
+    for i, state in enumerate(states):
+        for param in state.ellipsoid_params:
+            arrays["means"][i, quantitative_positions[param.field]] = param.mean
+            arrays["stds"][i, quantitative_positions[param.field]] = param.std
+
+    if moments is not None:
+        arrays.update(
+            {
+                "moments_positions": moments.positions.astype("<i4"),
+                "moments_counts": moments.counts.astype("<i8"),
+                "moments_sizes": moments.sizes.astype("<i8"),
+                "moments_means": moments.means.astype("<f8"),
+                "moments_m2": moments.m2.astype("<f8"),
+            }
+        )
+
+    header = {
+        "clear_anomalies": clear_anomalies,
+        "splits": [
+            {"field": split.field, "type": "qualitative", "splits": [value.item() for value in np.array(split.splits)]}
+            if isinstance(split, QualitativeSplit)
+            else {"field": split.field, "type": "quantitative", "size": len(split.splits)}
+            for split in splits
+        ],
+        "arrays": {},
+    }
+
+    # The header stores array offsets, so they are recomputed until the header fits in front of the arrays.
+    data_offset = ALIGNMENT
+    while True:
+        offset = data_offset
+        for name, array in arrays.items():
+            header["arrays"][name] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+            offset = _align(offset + array.nbytes)
+        header_bytes = json.dumps(header).encode()
+        if _PREFIX.size + len(header_bytes) <= data_offset:
+            break
+        data_offset = _align(_PREFIX.size + len(header_bytes))
+
+    with open(path, "wb") as file:
+        file.write(_PREFIX.pack(MAGIC, VERSION, len(header_bytes)))
+        file.write(header_bytes)
+        for name, array in arrays.items():
+            file.seek(header["arrays"][name]["offset"])
+            file.write(array.tobytes())
+        file.truncate(offset)
+
+
+def load_binary_model(path: str) -> tuple[SplitsCollection, StatesCollection, Optional[StatesMoments], bool]:
+    with open(path, "rb") as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, header_length = _PREFIX.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a binary model file.")
+    if version != VERSION:
+        raise ValueError(f"Unsupported binary model version {version}, expected {VERSION}.")
+    header = json.loads(buffer[_PREFIX.size : _PREFIX.size + header_length])  # noqa: E203
+
+    # Arrays are read-only views of the mapped file, nothing is copied until it is used.
+    arrays = {
+        name: np.frombuffer(
+            buffer, dtype=params["dtype"], count=int(np.prod(params["shape"])), offset=params["offset"]
+        ).reshape(params["shape"])
+        for name, params in header["arrays"].items()
+    }
+
+    splits = []
+    edges_offset = 0
+    for split in header["splits"]:
+        if split["type"] == "qualitative":
+            splits.append(QualitativeSplit(split["field"], split["splits"]))
+            continue
+        edges = arrays["edges"][edges_offset : edges_offset + split["size"]]  # noqa: E203
+        quantitative_split = QuantitativeSplit(split["field"], [tuple(edge) for edge in edges.tolist()])
+        quantitative_split.__dict__["_edges"] = (edges[:, 0], edges[:, 1])
+        splits.append(quantitative_split)
+        edges_offset += split["size"]
+    splits = SplitsCollection(splits)
+
+    states = StatesCollection.from_arrays(arrays["state_positions"], arrays["means"], arrays["stds"], splits)
+
+    moments = None
+    if "moments_counts" in arrays:
+        moments = StatesMoments(
+            splits,
+            arrays["moments_positions"],
+            arrays["moments_counts"],
+            arrays["moments_sizes"],
+            arrays["moments_means"],
+            arrays["moments_m2"],
+        )
+
+    return splits, states, moments, header.get("clear_anomalies", True)
@@ -0,0 +1,47 @@
+from typing import Iterable
+
+
+def hamming_distance(first: int, second: int) -> int:
+    return bin(first ^ second).count("1")
+
+
+class BKTree:
+    _nodes: list[tuple[int, dict[int, int]]]
+
+    def __init__(self, values: Iterable[int] = ()) -> None:
+        self._nodes = []
+        for value in values:
+            self.add(value)
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def add(self, value: int) -> int:
+        node_id = len(self._nodes)
+        self._nodes.append((value, {}))
+        if not node_id:
+            return node_id
+
+        current = 0
+        while True:
+            current_value, children = self._nodes[current]
+            distance = hamming_distance(value, current_value)
+            if distance not in children:
+                children[distance] = node_id
+                return node_id
+            current = children[distance]
+
+    def search(self, value: int, radius: int) -> list[tuple[int, int]]:
+        if not self._nodes:
+            return []
+
+        found = []
+        stack = [0]
+        while stack:
+            node_id = stack.pop()
+            node_value, children = self._nodes[node_id]
+            distance = hamming_distance(value, node_value)
+            if distance <= radius:
+                found.append((node_id, distance))
+            stack.extend(child for edge, child in children.items() if distance - radius <= edge <= distance + radius)
+        return found
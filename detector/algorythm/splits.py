@@ -1,14 +1,14 @@
 import abc
+import math
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from decimal import Decimal
+from functools import cached_property
 from statistics import mean, stdev
-from typing import Generator, Union
+from typing import ClassVar, Generator, Iterable, Optional, Union
 
 import numpy as np
 import pandas as pd
-import seaborn as sns
-from matplotlib import pyplot as plt
-from scipy.signal import argrelextrema
 
 
 @dataclass
@@ -20,6 +20,10 @@ class BaseSplit(abc.ABC):
     def get_value_position(self, value: Union[float, int]) -> tuple[int, bool]:  # pragma: no cover
         pass
 
+    @abc.abstractmethod
+    def get_values_positions(self, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:  # pragma: no cover
+        pass
+
     def get_value_from_vector(self, vector: str) -> int:
         for i, value in enumerate(map(int, vector)):
             if value:
@@ -42,6 +46,19 @@ class QuantitativeSplit(BaseSplit):
             out_of_range = True
         return index, out_of_range
 
+    @cached_property
+    def _edges(self) -> tuple[np.ndarray, np.ndarray]:
+        splits = np.array(self.splits, dtype=float)
+        return splits[:, 0], splits[:, 1]
+
+    def get_values_positions(self, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        starts, ends = self._edges
+        last = len(starts) - 1
+        indexes = np.clip(np.searchsorted(starts, values, side="right") - 1, 0, last)
+        in_range = ((values >= starts[indexes]) & (values < ends[indexes])) | (values == ends[-1])
+        indexes = np.where(in_range, indexes, np.where(values < starts[0], 0, last))
+        return indexes, ~in_range
+
 
 class QualitativeSplit(BaseSplit):
     def get_value_position(self, value: Union[float, int]) -> tuple[int, bool]:
@@ -56,23 +73,33 @@ class QualitativeSplit(BaseSplit):
             out_of_range = True
         return index, out_of_range
 
+    @cached_property
+    def _values(self) -> np.ndarray:
+        return np.array(self.splits, dtype=float)
+
+    def get_values_positions(self, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        matches = values[:, np.newaxis] == self._values[np.newaxis, :]
+        in_range = matches.any(axis=1)
+        out_of_range_indexes = np.where(values < self._values.min(), 0, len(self._values) - 1)
+        indexes = np.where(in_range, matches.argmax(axis=1), out_of_range_indexes)
+        return indexes, ~in_range
+
 
 @dataclass
 class SplitsCollection:
     _splits: list[BaseSplit]
+    kde_gridsize: ClassVar[int] = 200
+    kde_max_samples: ClassVar[Optional[int]] = 100_000
 
     @classmethod
-    def _append_qualitative(cls, splits: list[BaseSplit], field: str, values: pd.Series) -> list[BaseSplit]:
-        splits.append(
-            QualitativeSplit(
-                field=field,
-                splits=sorted(values.unique()),
-            )
+    def _qualitative_split(cls, field: str, values: pd.Series) -> QualitativeSplit:
+        return QualitativeSplit(
+            field=field,
+            splits=sorted(values.unique()),
         )
-        return splits
 
     @classmethod
-    def _append_quantitative(cls, splits: list[BaseSplit], field: str, values: pd.Series) -> list[BaseSplit]:
+    def _quantitative_split(cls, field: str, values: pd.Series) -> Optional[QuantitativeSplit]:
         serie = values.copy()
         need_round = serie.dtype == "int64"
 
@@ -114,13 +141,16 @@ class SplitsCollection:
         if len(final_splits) < 2:  # pragma no cover
             return
 
-        splits.append(
-            QuantitativeSplit(
-                field=field,
-                splits=final_splits,
-            )
+        return QuantitativeSplit(
+            field=field,
+            splits=final_splits,
         )
-        return splits
+
+    @classmethod
+    def _build_split(cls, field: str, values: pd.Series, qualitative: bool) -> Optional[BaseSplit]:
+        if qualitative:
+            return cls._qualitative_split(field, values)
+        return cls._quantitative_split(field, values)
 
     @staticmethod
     def _get_interval(data: pd.Series) -> tuple[float, float]:
@@ -128,19 +158,27 @@ class SplitsCollection:
             return data.min(), data.max()
         return (min(mean(data) - 3 * stdev(data), data.min()), max(mean(data) + 3 * stdev(data), data.max()))
 
-    @staticmethod
-    def _find_mininmums(data: pd.Series) -> np.ndarray:
-        lines = sns.histplot(data, kde=True).get_lines()
-        if not len(lines):
+    @classmethod
+    def _find_mininmums(cls, data: pd.Series) -> np.ndarray:
+        # scipy is only needed to fit a model, loading a saved one should not pay for importing it.
+        from scipy.signal import argrelextrema
+        from scipy.stats import gaussian_kde
+
+        data = data.dropna().to_numpy(dtype=float)
+        if len(data) < 2:
+            return []
+        variance = data.var(ddof=1)
+        if math.isclose(variance, 0) or np.isnan(variance):
             return []
-        x, y = lines[0].get_data()
-        plt.close()
+
+        x = np.linspace(data.min(), data.max(), cls.kde_gridsize)
+        if cls.kde_max_samples and len(data) > cls.kde_max_samples:
+            data = np.random.default_rng(0).choice(data, cls.kde_max_samples, replace=False)
+        y = gaussian_kde(data)(x)
+
         filt = x >= 0
         x = x[filt]
         y = y[filt]
-        sortId = np.argsort(x)
-        x = x[sortId]
-        y = y[sortId]
         return x[argrelextrema(y, np.less)[0]]
 
     @property
@@ -155,6 +193,54 @@ class SplitsCollection:
     def qualitative_fields(self) -> list[str]:
         return [split.field for split in self if isinstance(split, QualitativeSplit)]
 
+    @cached_property
+    def _field_shifts(self) -> list[int]:
+        shifts = []
+        shift = len(self.as_columns)
+        for split in self:
+            shift -= len(split.splits)
+            shifts.append(shift)
+        return shifts
+
+    @cached_property
+    def field_masks(self) -> list[int]:
+        return [((1 << len(split.splits)) - 1) << shift for split, shift in zip(self, self._field_shifts)]
+
+    def value_from_int(self, index: int, vector: int) -> Union[tuple[float, float], float, int, None]:
+        split = self[index]
+        bits = (vector & self.field_masks[index]) >> self._field_shifts[index]
+        if not bits:
+            return None
+        return split.splits[len(split.splits) - bits.bit_length()]
+
+    def positions(self, data: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+        positions = np.zeros((len(data), len(self)), dtype=int)
+        out_of_range = np.zeros((len(data), len(self)), dtype=bool)
+        for i, split in enumerate(self):
+            positions[:, i], out_of_range[:, i] = split.get_values_positions(np.asarray(data[split.field], dtype=float))
+        return positions, out_of_range
+
+    def encode(self, data: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+        positions, out_of_range = self.positions(data)
+        encoded = np.zeros((len(data), len(self.as_columns)))
+        rows = np.arange(len(data))
+        offset = 0
+        for i, split in enumerate(self):
+            encoded[rows, offset + positions[:, i]] = 1
+            offset += len(split.splits)
+        return encoded, out_of_range.any(axis=1)
+
+    def state_from_positions(self, positions: tuple[int]) -> tuple[int]:
+        return tuple(int(i == position) for split, position in zip(self, positions) for i in range(len(split.splits)))
+
+    def positions_from_state(self, state: tuple[int]) -> tuple[int]:
+        positions = []
+        offset = 0
+        for split in self:
+            positions.append(list(map(int, state[offset : offset + len(split.splits)])).index(1))  # noqa: E203
+            offset += len(split.splits)
+        return tuple(positions)
+
     def __iter__(self) -> Generator[BaseSplit, None, None]:
         for split in self._splits:
             yield split
@@ -168,14 +254,61 @@ class SplitsCollection:
         return cls([split_types[split["type"]](split["field"], split["splits"]) for split in data])
 
     @classmethod
-    def build(cls, data: pd.DataFrame, qualitatives: list[str] = []) -> "SplitsCollection":
-        splits = []
-        for field in data.columns:
-            if field in qualitatives:
-                cls._append_qualitative(splits, field, data[field])
+    def build(
+        cls, data: pd.DataFrame, qualitatives: list[str] = [], workers: Optional[int] = None
+    ) -> "SplitsCollection":
+        fields = list(data.columns)
+        args = (fields, [data[field] for field in fields], [field in qualitatives for field in fields])
+        if workers and workers > 1 and len(fields) > 1:
+            # Fields are independent and executor.map keeps their order, so the result does not depend on workers.
+            with ProcessPoolExecutor(max_workers=min(workers, len(fields))) as executor:
+                splits = list(executor.map(cls._build_split, *args))
+        else:
+            splits = list(map(cls._build_split, *args))
+        return cls([split for split in splits if split is not None])
+
+    @classmethod
+    def build_from_chunks(
+        cls,
+        chunks: Iterable[pd.DataFrame],
+        qualitatives: list[str] = [],
+        workers: Optional[int] = None,
+        sample_size: int = 100_000,
+    ) -> "SplitsCollection":
+        # Splits are built from a uniform sample of at most sample_size rows: every row gets a random key and
+        # the rows with the smallest keys are kept. Qualitative values and the range of quantitative fields are
+        # collected from all rows, so the splits still cover every value of the stream.
+        rng = np.random.default_rng(0)
+        sample, keys = None, np.empty(0)
+        values: dict[str, set] = {}
+        bounds: dict[str, tuple[float, float]] = {}
+        for chunk in chunks:
+            if chunk.empty:
+                continue
+            for field in chunk.columns:
+                if field in qualitatives:
+                    values.setdefault(field, set()).update(chunk[field].unique())
+                    continue
+                mi, ma = bounds.get(field, (math.inf, -math.inf))
+                bounds[field] = (min(mi, chunk[field].min()), max(ma, chunk[field].max()))
+            sample = chunk if sample is None else pd.concat([sample, chunk], ignore_index=True)
+            keys = np.concatenate([keys, rng.random(len(chunk))])
+            if len(sample) > sample_size:
+                keep = np.sort(np.argpartition(keys, sample_size)[:sample_size])
+                sample, keys = sample.iloc[keep].reset_index(drop=True), keys[keep]
+
+        if sample is None:
+            return cls([])
+
+        splits = cls.build(sample, qualitatives=qualitatives, workers=workers)
+        for split in splits:
+            if isinstance(split, QualitativeSplit):
+                split.splits = sorted(values[split.field])
                 continue
-            cls._append_quantitative(splits, field, data[field])
-        return cls(splits)
+            mi, ma = bounds[split.field]
+            split.splits[0] = (float(min(split.splits[0][0], mi)), split.splits[0][1])
+            split.splits[-1] = (split.splits[-1][0], float(max(split.splits[-1][1], ma)))
+        return splits
 
     def to_dict(self) -> list[dict[str, Union[list[Union[int, float]], str]]]:
         return [
@@ -1,10 +1,13 @@
 from dataclasses import asdict, dataclass, field
+from functools import cached_property
 from math import pow
-from typing import Any, Generator, Optional, Union
+from typing import Any, Generator, Iterable, Optional, Union
 
+import numpy as np
 import pandas as pd
 
-from .splits import SplitsCollection
+from .bk_tree import BKTree
+from .splits import QualitativeSplit, SplitsCollection
 
 
 @dataclass
@@ -55,9 +58,12 @@ class State:
     def binary_vector(self) -> str:
         return "".join(map(str, map(int, self.state)))
 
-    @property
+    @cached_property
     def as_int(self) -> int:
-        return int(self.binary_vector, 2)
+        value = 0
+        for bit in self.state:
+            value = (value << 1) | bit
+        return value
 
     @property
     def normal_ellipsoid_params(self) -> list[EllipsoidParam]:
@@ -71,14 +77,11 @@ class State:
             if param.std == 0 and int(param.mean) == param.mean
         ]
 
-    def _difference_vector(self, state: "State") -> str:
-        return "{0:b}".format(state.as_int ^ self.as_int)
-
     def distance(self, state: Union["State", tuple[int]], /) -> int:
         if isinstance(state, tuple):
             state = State(state)
 
-        return int(sum(map(int, self._difference_vector(state))) / 2)
+        return bin(self.as_int ^ state.as_int).count("1") // 2
 
     def fields_differ(
         self, state: Union["State", tuple[int]], splits_collection: SplitsCollection, /
@@ -86,24 +89,16 @@ class State:
         if isinstance(state, tuple):
             state = State(state)
 
-        difference_indexes = [
-            i
-            for i, vector in enumerate(
-                splits_collection.split_vector(self._difference_vector(state).zfill(len(self.binary_vector)))
-            )
-            if any(map(int, vector))
-        ]
-
-        splited_vector_self = splits_collection.split_vector(self.binary_vector)
-        splited_vector_state = splits_collection.split_vector(state.binary_vector)
+        difference = self.as_int ^ state.as_int
 
         return [
             {
-                "field": splits_collection[index].field,
-                "self_interval": splits_collection[index].get_value_from_vector(splited_vector_self[index]),
-                "state_interval": splits_collection[index].get_value_from_vector(splited_vector_state[index]),
+                "field": split.field,
+                "self_interval": splits_collection.value_from_int(index, self.as_int),
+                "state_interval": splits_collection.value_from_int(index, state.as_int),
             }
-            for index in difference_indexes
+            for index, (split, mask) in enumerate(zip(splits_collection, splits_collection.field_masks))
+            if difference & mask
         ]
 
     def __contains__(self, obj: pd.Series) -> bool:
@@ -138,18 +133,115 @@ class State:
 
 
 class StatesCollection:
-    _states: set[State]
     _splits: SplitsCollection
-
-    def __init__(self, states: set[Union[State, tuple[int]]], splits: Optional[SplitsCollection] = None) -> None:
-        self._states = set(State(state) if not isinstance(state, State) else state for state in states)
+    _arrays: Optional[tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+    _rows_chunk_size: int = 1024
+    _states_block_size: int = 64
+
+    def __init__(
+        self, states: Optional[set[Union[State, tuple[int]]]], splits: Optional[SplitsCollection] = None
+    ) -> None:
+        if states is not None:
+            self._states = set(State(state) if not isinstance(state, State) else state for state in states)
         self._splits = splits
 
+    @classmethod
+    def from_arrays(
+        cls, positions: np.ndarray, means: np.ndarray, stds: np.ndarray, splits: SplitsCollection
+    ) -> "StatesCollection":
+        collection = cls(None, splits=splits)
+        collection._arrays = (positions, means, stds)
+        return collection
+
+    @cached_property
+    def _states(self) -> set[State]:
+        positions, means, stds = self._arrays
+        quantitative_splits = [split for split in self._splits if not isinstance(split, QualitativeSplit)]
+        qualitative_splits = [(i, split) for i, split in enumerate(self._splits) if isinstance(split, QualitativeSplit)]
+
+        states = set()
+        for state_positions, state_means, state_stds in zip(positions.tolist(), means.tolist(), stds.tolist()):
+            state = self._splits.state_from_positions(state_positions)
+            ellipsoids = [
+                EllipsoidParam(split.field, mean, std)
+                for split, mean, std in zip(quantitative_splits, state_means, state_stds)
+            ]
+            qualitative_values = [
+                QualitativeValue(split.field, split.splits[state_positions[i]]) for i, split in qualitative_splits
+            ]
+            states.add(State(state, ellipsoids, qualitative_values))
+        return states
+
     def __repr__(self) -> str:
         return str(self._states)
 
     def __contains__(self, obj: pd.Series) -> bool:
-        return any([obj in state for state in self._states])
+        return bool(self.contains(obj.to_frame().T)[0])
+
+    def _ellipsoids_from_arrays(self) -> tuple[list[str], np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        positions, means, stds = self._arrays
+        quantitative_fields = [split.field for split in self._splits if not isinstance(split, QualitativeSplit)]
+        qualitative_splits = [(i, split) for i, split in enumerate(self._splits) if isinstance(split, QualitativeSplit)]
+        qualitative_shape = (len(positions), len(qualitative_splits))
+
+        normal = stds != 0
+        qualitative_values = np.zeros(qualitative_shape)
+        for j, (i, split) in enumerate(qualitative_splits):
+            qualitative_values[:, j] = np.asarray(split.splits, dtype=float)[positions[:, i]]
+
+        return (
+            quantitative_fields + [split.field for _, split in qualitative_splits],
+            np.hstack([np.where(normal, means, 0), np.zeros(qualitative_shape)]),
+            np.hstack([np.where(normal, stds, 1), np.ones(qualitative_shape)]),
+            np.hstack([normal, np.zeros(qualitative_shape, dtype=bool)]),
+            np.hstack([~normal & (means == np.trunc(means)), np.ones(qualitative_shape, dtype=bool)]),
+            np.hstack([means, qualitative_values]),
+        )
+
+    @cached_property
+    def _ellipsoids(self) -> tuple[list[str], np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        if self._arrays is not None:
+            return self._ellipsoids_from_arrays()
+
+        fields = list(
+            dict.fromkeys(
+                param.field for state in self._states for param in state.ellipsoid_params + state.qualitative_values
+            )
+        )
+        positions = {field: i for i, field in enumerate(fields)}
+        shape = (len(self._states), len(fields))
+        means, stds, values = np.zeros(shape), np.ones(shape), np.zeros(shape)
+        normal, qualitative = np.zeros(shape, dtype=bool), np.zeros(shape, dtype=bool)
+
+        for i, state in enumerate(self._states):
+            for param in state.normal_ellipsoid_params:
+                position = positions[param.field]
+                means[i, position], stds[i, position], normal[i, position] = param.mean, param.std, True
+            for qualitative_value in state.qualitative_values + state.ellipsoid_params_as_qualitatives:
+                position = positions[qualitative_value.field]
+                values[i, position], qualitative[i, position] = qualitative_value.value, True
+
+        return fields, means, stds, normal, qualitative, values
+
+    def contains(self, data: pd.DataFrame) -> np.ndarray:
+        fields, means, stds, normal, qualitative, values = self._ellipsoids
+        matched = np.zeros(len(data), dtype=bool)
+        data = data[fields].to_numpy(dtype=float)
+
+        for rows_start in range(0, len(data), self._rows_chunk_size):
+            rows_chunk = slice(rows_start, rows_start + self._rows_chunk_size)
+            for states_start in range(0, len(means), self._states_block_size):
+                rows = rows_start + np.flatnonzero(~matched[rows_chunk])
+                if not len(rows):
+                    break
+                block = slice(states_start, states_start + self._states_block_size)
+                sample = data[rows, np.newaxis, :]
+                with np.errstate(invalid="ignore"):
+                    ellipsoid_values = np.where(normal[block], (sample - means[block]) ** 2 / stds[block] ** 2, 0)
+                equal = np.where(qualitative[block], sample == values[block], True).all(axis=2)
+                matched[rows] = ((ellipsoid_values.sum(axis=2) <= 1) & equal).any(axis=1)
+
+        return matched
 
     def __len__(self) -> int:
         return len(self._states)
@@ -176,19 +268,29 @@ class StatesCollection:
         if isinstance(state, tuple):
             state = State(state)
 
-        def additional_statement(val):
+        def additional_statement(distance):
             if not ignore_zero_difference:
                 return True
-            return val ^ state > 0
+            return distance > 0
+
+        states, index = self._index
+        # Distance between one-hot states is half of their Hamming distance.
+        found = sorted(
+            (distance // 2, node_id)
+            for node_id, distance in index.search(state.as_int, 2 * max_distance + 1)
+            if additional_statement(distance // 2)
+        )
 
         return StatesCollection(
-            sorted(
-                filter(lambda s: s ^ state <= max_distance and additional_statement(s), self._states),
-                key=lambda s: s ^ state,
-            ),
+            [states[node_id] for _, node_id in found],
             splits=self._splits,
         )
 
+    @cached_property
+    def _index(self) -> tuple[list[State], BKTree]:
+        states = list(self._states)
+        return states, BKTree(state.as_int for state in states)
+
     def fields_differ(self, state: Union["State", tuple[int]]) -> dict[State, list[dict[str, Any]]]:
         if not self._splits:
             raise ValueError("You should create StatesCollection with SplitsCollection.")
@@ -209,53 +311,154 @@ class StatesCollection:
 
     @classmethod
     def build(cls, states: set[tuple[int]], data: pd.DataFrame, splits: SplitsCollection) -> "StatesCollection":
-        states_objs = set()
-        columns = splits.splits_columns
-        qualitative_fields = splits.qualitative_fields
-        for state in states:
-            state_splits = splits.splits_from_state(state)
-            filt = True
-            for column in columns:
-                if column in qualitative_fields:
-                    filt &= data[column] == state_splits[column]
-                    continue
-                mi, ma = state_splits[column]
-                filt &= (data[column] >= mi) & (data[column] < ma)
-            values = data[filt]
-            ellipsoids = []
-            qualitative_values = []
-            for column in columns:
-                if column in qualitative_fields:
-                    qualitative_values.append(
-                        QualitativeValue(
-                            column,
-                            state_splits[column],
-                        )
-                    )
-                    continue
-                column_values = values[column]
-                if len(column_values) <= 2:
-                    mi, ma = state_splits[column]
-                    mean, std = (ma + mi) / 2, (ma - mi) / 2
-                else:
-                    mean, std = column_values.mean(), 3 * column_values.std()
-                ellipsoids.append(
-                    EllipsoidParam(
-                        column,
-                        mean,
-                        std,
-                    )
-                )
-            states_objs.add(State(state, ellipsoids, qualitative_values))
+        return StatesMoments.from_data(data, splits).to_states(splits.positions_from_state(state) for state in states)
 
+    @classmethod
+    def from_dict(cls, data: list, splits: Optional[SplitsCollection] = None) -> "StatesCollection":
         return cls(
-            states_objs,
+            set(State.from_dict(state) for state in data),
             splits=splits,
         )
 
+
+class StatesMoments:
+    _splits: SplitsCollection
+    positions: np.ndarray
+    counts: np.ndarray
+    sizes: np.ndarray
+    means: np.ndarray
+    m2: np.ndarray
+    density_threshold: float = 0.89
+
+    def __init__(
+        self,
+        splits: SplitsCollection,
+        positions: np.ndarray,
+        counts: np.ndarray,
+        sizes: np.ndarray,
+        means: np.ndarray,
+        m2: np.ndarray,
+    ) -> None:
+        self._splits = splits
+        self.positions = np.asarray(positions, dtype=int).reshape(len(counts), len(splits))
+        self.counts = np.asarray(counts, dtype=int)
+        self.sizes = np.asarray(sizes, dtype=int)
+        self.means = np.asarray(means, dtype=float).reshape(len(counts), len(self._quantitative_fields))
+        self.m2 = np.asarray(m2, dtype=float).reshape(len(counts), len(self._quantitative_fields))
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    @property
+    def _quantitative_fields(self) -> list[str]:
+        return [split.field for split in self._splits if not isinstance(split, QualitativeSplit)]
+
     @classmethod
-    def from_dict(cls, data: list, splits: Optional[SplitsCollection] = None) -> "StatesCollection":
+    def from_data(cls, data: pd.DataFrame, splits: SplitsCollection) -> "StatesMoments":
+        quantitative_fields = [split.field for split in splits if not isinstance(split, QualitativeSplit)]
+
+        positions, out_of_range = splits.positions(data)
+        # States use half-open intervals, so rows on the upper edge of the last interval are encoded
+        # into it and counted in its density, but are not used for its mean and std.
+        outside = out_of_range.any(axis=1)
+        for split in splits:
+            if split.field in quantitative_fields:
+                outside |= np.asarray(data[split.field], dtype=float) == split.splits[-1][1]
+
+        keys = [f"_position_{i}" for i in range(len(splits))]
+        frame = pd.concat(
+            [
+                data[quantitative_fields].astype(float).reset_index(drop=True),
+                pd.DataFrame(positions, columns=keys),
+            ],
+            axis=1,
+        )
+        counts = frame.groupby(keys).size()
+        grouped = frame[~outside].groupby(keys)[quantitative_fields]
+        sizes = grouped.size().reindex(counts.index, fill_value=0)
+
         return cls(
-            set(State.from_dict(state) for state in data),
-            splits=splits,
+            splits,
+            counts.index.tolist(),
+            counts.to_numpy(),
+            sizes.to_numpy(),
+            grouped.mean().reindex(counts.index).fillna(0).to_numpy(),
+            grouped.var().mul(sizes - 1, axis=0).reindex(counts.index).fillna(0).to_numpy(),
         )
+
+    def merge(self, other: "StatesMoments") -> "StatesMoments":
+        index = {key: i for i, key in enumerate(map(tuple, self.positions.tolist()))}
+        target = np.array(
+            [index.setdefault(key, len(index)) for key in map(tuple, other.positions.tolist())], dtype=int
+        )
+        added = len(index) - len(self)
+
+        positions = np.vstack([self.positions, np.zeros((added, len(self._splits)), dtype=int)])
+        positions[target] = other.positions
+        counts = np.concatenate([self.counts, np.zeros(added, dtype=int)])
+        sizes = np.concatenate([self.sizes, np.zeros(added, dtype=int)])
+        means = np.vstack([self.means, np.zeros((added, self.means.shape[1]))])
+        m2 = np.vstack([self.m2, np.zeros((added, self.m2.shape[1]))])
+
+        # Pooled mean and sum of squared deviations of two samples (Chan et al.).
+        size_a, size_b = sizes[target], other.sizes
+        size = size_a + size_b
+        with np.errstate(invalid="ignore", divide="ignore"):
+            weight = np.where(size > 0, size_b / size, 0)[:, np.newaxis]
+            correction = np.where(size > 0, size_a * size_b / size, 0)[:, np.newaxis]
+        delta = other.means - means[target]
+        means[target] = means[target] + delta * weight
+        m2[target] = m2[target] + other.m2 + delta**2 * correction
+        sizes[target] = size
+        counts[target] += other.counts
+
+        return StatesMoments(self._splits, positions, counts, sizes, means, m2)
+
+    def select(self, clear_anomalies=True) -> list[tuple[int]]:
+        total_rows = self.counts.sum()
+        total_percent = 0
+        selected = []
+        for i in sorted(range(len(self)), key=lambda i: (-self.counts[i], self.positions[i].tolist())):
+            total_percent += self.counts[i] / total_rows
+            selected.append(tuple(self.positions[i].tolist()))
+            if total_percent > self.density_threshold and clear_anomalies:
+                break
+        return selected
+
+    def to_states(self, positions: Iterable[tuple[int]]) -> StatesCollection:
+        index = {key: i for i, key in enumerate(map(tuple, self.positions.tolist()))}
+        quantitative_fields = self._quantitative_fields
+
+        states = set()
+        for state_positions in positions:
+            i = index.get(tuple(state_positions))
+            size = self.sizes[i] if i is not None else 0
+            ellipsoids = []
+            qualitative_values = []
+            for split, position in zip(self._splits, state_positions):
+                if split.field not in quantitative_fields:
+                    qualitative_values.append(QualitativeValue(split.field, split.splits[position]))
+                    continue
+                if size <= 2:
+                    mi, ma = split.splits[position]
+                    mean, std = (ma + mi) / 2, (ma - mi) / 2
+                else:
+                    column = len(ellipsoids)
+                    mean, std = self.means[i, column], 3 * np.sqrt(self.m2[i, column] / (size - 1))
+                ellipsoids.append(EllipsoidParam(split.field, mean, std))
+            states.add(State(self._splits.state_from_positions(state_positions), ellipsoids, qualitative_values))
+
+        return StatesCollection(states, splits=self._splits)
+
+    def to_dict(self) -> dict[str, list]:
+        return {
+            "positions": self.positions.tolist(),
+            "counts": self.counts.tolist(),
+            "sizes": self.sizes.tolist(),
+            "means": self.means.tolist(),
+            "m2": self.m2.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, list], splits: SplitsCollection) -> "StatesMoments":
+        return cls(splits, data["positions"], data["counts"], data["sizes"], data["means"], data["m2"])
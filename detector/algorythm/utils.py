@@ -3,7 +3,7 @@ from decimal import Decimal
 import numpy as np
 
 from .splits import SplitsCollection
-from .states import StatesCollection
+from .states import StatesCollection, StatesMoments
 
 
 def json_default(obj):  # pragma: no cover
@@ -15,6 +15,6 @@ def json_default(obj):  # pragma: no cover
         return list(obj)
     elif isinstance(obj, np.int64):
         return int(obj)
-    elif isinstance(obj, (SplitsCollection, StatesCollection)):
+    elif isinstance(obj, (SplitsCollection, StatesCollection, StatesMoments)):
         return obj.to_dict()
     return str(obj)
@@ -0,0 +1,108 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import repeat
+from math import ceil
+from os import cpu_count
+from typing import Optional, Type
+
+import pandas as pd
+
+from detector.aggregator import Aggregator
+from detector.algorythm import AnomalyDetector
+from detector.db import BaseRawValue, RawCleanedValue, Session, get_engine
+
+_detector: Optional[AnomalyDetector] = None
+
+RESULT_COLUMNS = ["dttm", "label", "anomaly", "out_of_range", "closest_states"]
+
+
+def _init_worker(detector: AnomalyDetector, bind_session=True) -> None:  # pragma: no cover
+    global _detector
+    _detector = detector
+    if bind_session:
+        Session.remove()
+        Session.configure(bind=get_engine())
+
+
+def _run_chunk(
+    dttms: list[datetime], raw_value_cls: Type[BaseRawValue], max_difference_to_skip: Optional[int]
+) -> pd.DataFrame:
+    windows = Aggregator().load_windows(raw_value_cls, dttm_from=dttms[0], dttm_to=dttms[-1])
+    return label_windows(_detector, windows, max_difference_to_skip=max_difference_to_skip)
+
+
+def label_windows(
+    detector: AnomalyDetector, windows: pd.DataFrame, max_difference_to_skip: Optional[int] = None
+) -> pd.DataFrame:
+    if windows.empty:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+
+    labels = detector.classify(windows)["label"]
+    anomalies = {
+        anomaly["index"]: anomaly
+        for anomaly in detector.detect(windows, raise_exception=False, max_difference_to_skip=max_difference_to_skip)
+    }
+
+    return pd.DataFrame(
+        {
+            "dttm": windows.index,
+            "label": labels.values,
+            "anomaly": [dttm in anomalies for dttm in windows.index],
+            "out_of_range": [anomalies[dttm]["out_of_range"] if dttm in anomalies else False for dttm in windows.index],
+            "closest_states": [
+                len(anomalies[dttm]["closest_states"]) if dttm in anomalies else 0 for dttm in windows.index
+            ],
+        },
+        columns=RESULT_COLUMNS,
+    )
+
+
+class Backtest:
+    _detector: AnomalyDetector
+    _aggregator: Aggregator
+    _raw_value_cls: Type[BaseRawValue]
+    _workers: int
+    _chunks_per_worker: int = 4
+    max_difference_to_skip: Optional[int] = None
+
+    def __init__(
+        self,
+        detector: AnomalyDetector,
+        raw_value_cls: Type[BaseRawValue] = RawCleanedValue,
+        workers: Optional[int] = None,
+        max_difference_to_skip: Optional[int] = None,
+    ) -> None:
+        self._detector = detector
+        self._aggregator = Aggregator()
+        self._raw_value_cls = raw_value_cls
+        self._workers = workers or cpu_count() or 1
+        if max_difference_to_skip:
+            self.max_difference_to_skip = int(max_difference_to_skip)
+
+    def _split(self, dttms: list[datetime]) -> list[list[datetime]]:
+        chunk_size = max(ceil(len(dttms) / (self._workers * self._chunks_per_worker)), 1)
+        return [dttms[i : i + chunk_size] for i in range(0, len(dttms), chunk_size)]  # noqa: E203
+
+    def run(self, dttm_from: Optional[datetime] = None, dttm_to: Optional[datetime] = None) -> pd.DataFrame:
+        self._aggregator.refresh_windows(self._raw_value_cls)
+        chunks = self._split(self._aggregator.get_dttms(self._raw_value_cls, dttm_from, dttm_to))
+        args = (chunks, repeat(self._raw_value_cls), repeat(self.max_difference_to_skip))
+
+        if self._workers == 1 or len(chunks) <= 1:
+            _init_worker(self._detector, bind_session=False)
+            results = list(map(_run_chunk, *args))
+        else:  # pragma: no cover
+            # Under the fork start method the detector loaded by the parent is shared with
+            # the workers instead of being loaded or unpickled once per chunk.
+            with ProcessPoolExecutor(
+                max_workers=self._workers, initializer=_init_worker, initargs=(self._detector,)
+            ) as executor:
+                results = list(executor.map(_run_chunk, *args))
+
+        if not results:
+            return pd.DataFrame(columns=RESULT_COLUMNS)
+
+        return pd.concat(results, ignore_index=True)
+
+    def __str__(self) -> str:
+        return f"Backtest, workers: {self._workers}"
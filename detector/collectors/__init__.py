@@ -1,2 +1,3 @@
 from .csv_collector import CsvCollector
 from .db_collector import DBCollector
+from .parquet_collector import ParquetCollector
@@ -17,6 +17,9 @@ class BaseCollector(abc.ABC):
     def _collect(self, data: pd.DataFrame) -> None:  # pragma: no cover
         pass
 
+    def flush(self) -> None:
+        pass
+
     def collect(self, data: pd.DataFrame) -> None:
         dttm = datetime.now()
         self._collect(data)
@@ -1,21 +1,36 @@
 import pandas as pd
 
 from detector.collectors.base_collector import BaseCollector
-from detector.db import BaseRawValue, session_scope
+from detector.db import BaseRawValue, bulk_insert, session_scope
 
 
 class DBCollector(BaseCollector):
     _db_cls: BaseRawValue
+    _buffer_size: int
+    _buffer: list[pd.DataFrame]
 
-    def __init__(self, raw_value_cls: BaseRawValue, *args, **kwargs) -> None:
+    def __init__(self, raw_value_cls: BaseRawValue, buffer_size: int = 1, *args, **kwargs) -> None:
         self._db_cls = raw_value_cls
+        self._buffer_size = max(int(buffer_size or 1), 1)
+        self._buffer = []
         super().__init__(*args, **kwargs)
 
     def _collect(self, data: pd.DataFrame) -> None:
+        self._buffer.append(data)
+        if len(self._buffer) >= self._buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        # Buffered snapshots are written in one transaction.
+        if not self._buffer:
+            return
+        data = pd.concat(self._buffer, ignore_index=True)
+        self._buffer = []
+        data = data.assign(
+            dttm=pd.to_datetime(data.dttm, unit="s"), create_time=pd.to_datetime(data.create_time, unit="s")
+        )
         with session_scope() as session:
-            data.dttm = pd.to_datetime(data.dttm, unit="s")
-            data.create_time = pd.to_datetime(data.create_time, unit="s")
-            session.add_all([self._db_cls(**kwargs) for kwargs in data.to_dict("records")])
+            bulk_insert(session, self._db_cls, data)
 
     def __str__(self) -> str:
         return "DBCollector"
@@ -0,0 +1,188 @@
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Iterator, Optional
+
+import pandas as pd
+
+from detector.collectors.base_collector import BaseCollector
+from detector.data_getter.process_getter import COLUMNS
+
+INDEX_FILENAME = "index.json"
+SEGMENT_SUFFIX = ".parquet"
+# The open segment has no parquet footer until it is closed, it is renamed only after that.
+INPROGRESS_SUFFIX = ".tmp"
+
+INT_COLUMNS = ["pid", "ppid", "num_threads", "nice", "connections", "open_files"]
+FLOAT_COLUMNS = ["cpu_percent", "memory_percent"]
+TIMESTAMP_COLUMNS = ["dttm", "create_time"]
+STRING_COLUMNS = [column for column in COLUMNS if column not in INT_COLUMNS + FLOAT_COLUMNS + TIMESTAMP_COLUMNS]
+
+
+def get_schema():
+    import pyarrow as pa
+
+    types = {
+        **{column: pa.int64() for column in INT_COLUMNS},
+        **{column: pa.float64() for column in FLOAT_COLUMNS},
+        **{column: pa.timestamp("us") for column in TIMESTAMP_COLUMNS},
+        **{column: pa.string() for column in STRING_COLUMNS},
+    }
+    return pa.schema([(column, types[column]) for column in COLUMNS])
+
+
+def read_index(directory: str) -> list[dict]:
+    try:
+        with open(os.path.join(directory, INDEX_FILENAME)) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return []
+
+
+def get_segments(directory: str) -> list[dict]:
+    # The index and the closed segments missing from it, when the collector stopped between the rename of
+    # a segment and the update of the index.
+    import pyarrow.parquet as pq
+
+    segments = read_index(directory)
+    indexed = {segment["filename"] for segment in segments}
+    for filename in sorted(os.listdir(directory) if os.path.isdir(directory) else []):
+        if not filename.endswith(SEGMENT_SUFFIX) or filename in indexed:
+            continue
+        dttms = pq.read_table(os.path.join(directory, filename), columns=["dttm"]).column("dttm").to_pandas()
+        if dttms.empty:
+            continue
+        segments.append(
+            {
+                "filename": filename,
+                "dttm_from": dttms.min().to_pydatetime().isoformat(),
+                "dttm_to": dttms.max().to_pydatetime().isoformat(),
+                "rows": len(dttms),
+            }
+        )
+    return sorted(segments, key=lambda segment: datetime.fromisoformat(segment["dttm_from"]))
+
+
+def read_segments(
+    directory: str,
+    columns: Optional[list[str]] = None,
+    dttm_from: Optional[datetime] = None,
+    dttm_to: Optional[datetime] = None,
+    batch_size: Optional[int] = None,
+) -> Iterator[pd.DataFrame]:
+    # Only the segments which overlap [dttm_from, dttm_to] are opened, and only the given columns are read.
+    # Without batch_size every segment is one frame, with it the row groups are read in batches.
+    import pyarrow.parquet as pq
+
+    for segment in get_segments(directory):
+        if dttm_from is not None and datetime.fromisoformat(segment["dttm_to"]) < dttm_from:
+            continue
+        if dttm_to is not None and datetime.fromisoformat(segment["dttm_from"]) > dttm_to:
+            continue
+        parquet_file = pq.ParquetFile(os.path.join(directory, segment["filename"]))
+        for batch in parquet_file.iter_batches(
+            batch_size=batch_size or parquet_file.metadata.num_rows, columns=columns
+        ):
+            data = batch.to_pandas()
+            if dttm_from is not None:
+                data = data[data.dttm >= dttm_from]
+            if dttm_to is not None:
+                data = data[data.dttm <= dttm_to]
+            yield data.reset_index(drop=True)
+
+
+class ParquetCollector(BaseCollector):
+    # Snapshots are buffered and written as row groups of a zstd compressed parquet segment. A segment is closed,
+    # renamed and added to the index when it covers rotate_minutes or grows over rotate_mb, only closed segments
+    # are read.
+    _directory: str
+    _buffer_size: int
+    _rotate_interval: timedelta
+    _rotate_bytes: int
+    _buffer: list[pd.DataFrame]
+    _writer = None
+    _segment: Optional[dict] = None
+
+    def __init__(
+        self, directory: str, buffer_size: int = 1, rotate_minutes: int = 60, rotate_mb: int = 64, *args, **kwargs
+    ) -> None:
+        self._directory = directory or "collected_data"
+        self._buffer_size = max(int(buffer_size or 1), 1)
+        self._rotate_interval = timedelta(minutes=rotate_minutes or 60)
+        self._rotate_bytes = (rotate_mb or 64) * 1024 * 1024
+        self._buffer = []
+        os.makedirs(self._directory, exist_ok=True)
+        super().__init__(*args, **kwargs)
+
+    def _collect(self, data: pd.DataFrame) -> None:
+        self._buffer.append(data)
+        if len(self._buffer) >= self._buffer_size:
+            self._write()
+
+    @staticmethod
+    def _prepare(data: pd.DataFrame) -> pd.DataFrame:
+        data = data.reindex(columns=COLUMNS)
+        # The getter fills missing values with 0, text columns keep them as NULL.
+        strings = {
+            column: data[column].where(data[column].notna() & (data[column] != 0)).map(str, na_action="ignore")
+            for column in STRING_COLUMNS
+        }
+        return data.assign(
+            **{column: pd.to_datetime(data[column], unit="s").dt.floor("us") for column in TIMESTAMP_COLUMNS},
+            **{column: pd.to_numeric(data[column]).astype("Int64") for column in INT_COLUMNS},
+            **{column: pd.to_numeric(data[column]).astype(float) for column in FLOAT_COLUMNS},
+            **strings,
+        )
+
+    def _write(self) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self._buffer:
+            return
+        data = self._prepare(pd.concat(self._buffer, ignore_index=True))
+        self._buffer = []
+        dttm_from, dttm_to = data.dttm.min().to_pydatetime(), data.dttm.max().to_pydatetime()
+
+        if self._writer is None:
+            filename = f"{dttm_from:%Y%m%dT%H%M%S%f}{SEGMENT_SUFFIX}"
+            path = os.path.join(self._directory, filename + INPROGRESS_SUFFIX)
+            self._writer = pq.ParquetWriter(path, get_schema(), compression="zstd")
+            self._segment = {"filename": filename, "dttm_from": dttm_from, "dttm_to": dttm_to, "rows": 0}
+        self._writer.write_table(pa.Table.from_pandas(data, schema=get_schema(), preserve_index=False))
+        self._segment["dttm_to"] = max(self._segment["dttm_to"], dttm_to)
+        self._segment["rows"] += len(data)
+
+        size = os.path.getsize(os.path.join(self._directory, self._segment["filename"] + INPROGRESS_SUFFIX))
+        if self._segment["dttm_to"] - self._segment["dttm_from"] >= self._rotate_interval or size >= self._rotate_bytes:
+            self._close_segment()
+
+    def _close_segment(self) -> None:
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._writer = None
+        # Closed segments left out of the index by a previous run are added to it as well.
+        index = get_segments(self._directory)
+        path = os.path.join(self._directory, self._segment["filename"])
+        os.replace(path + INPROGRESS_SUFFIX, path)
+        index.append(
+            {
+                **self._segment,
+                "dttm_from": self._segment["dttm_from"].isoformat(),
+                "dttm_to": self._segment["dttm_to"].isoformat(),
+            }
+        )
+        # The index is replaced at once, readers never see a partly written file.
+        path = os.path.join(self._directory, INDEX_FILENAME)
+        with open(f"{path}.tmp", "w") as file:
+            json.dump(index, file, indent=2)
+        os.replace(f"{path}.tmp", path)
+        self._segment = None
+
+    def flush(self) -> None:
+        self._write()
+        self._close_segment()
+
+    def __str__(self) -> str:
+        return f"ParquetCollector, directory: {self._directory}"
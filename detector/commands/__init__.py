@@ -1,4 +1,20 @@
-from .collect_command import CollectCommand
-from .detect_command import DetectCommand
-from .import_command import ImportCommand
-from .shell_command import ShellCommand
+from importlib import import_module
+
+# Commands are imported on first access so that running one command does not
+# pull in the dependencies of the others (IPython, curses, the algorithm stack).
+_commands = {
+    "BacktestCommand": "backtest_command",
+    "CollectCommand": "collect_command",
+    "DetectCommand": "detect_command",
+    "ImportCommand": "import_command",
+    "RetentionCommand": "retention_command",
+    "ShellCommand": "shell_command",
+}
+
+__all__ = list(_commands)
+
+
+def __getattr__(name: str):
+    if name not in _commands:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(import_module(f"{__name__}.{_commands[name]}"), name)
@@ -0,0 +1,51 @@
+from argparse import ArgumentParser
+from datetime import datetime
+
+from detector import settings
+from detector.algorythm import AnomalyDetector
+from detector.backtest import Backtest
+from detector.db import RawCleanedValue, RawValue
+
+from .base_command import BaseCommand
+
+
+class BacktestCommand(BaseCommand):
+    description = "Replay fitted detector over historical windows"
+
+    def add_arguments(self, parser: ArgumentParser):
+        parser.add_argument("--detector_file", help="Detector file", type=str, required=True)
+        parser.add_argument(
+            "--source",
+            help="Table to rebuild windows from",
+            default="raw_cleaned_values",
+            choices=["raw_cleaned_values", "raw_values"],
+        )
+        parser.add_argument("--date_from", help="ISO datetime of the first window", type=datetime.fromisoformat)
+        parser.add_argument("--date_to", help="ISO datetime of the last window", type=datetime.fromisoformat)
+        parser.add_argument("--workers", help="Number of worker processes", type=int, default=None)
+        parser.add_argument("--output", help="File name for per-window results", type=str, default="backtest.csv")
+
+    def handle(self, *args, **options):
+        raw_value_classes = {
+            "raw_cleaned_values": RawCleanedValue,
+            "raw_values": RawValue,
+        }
+
+        print("Loading detector")
+        detector = AnomalyDetector()
+        detector.load_model(options["detector_file"])
+
+        backtest = Backtest(
+            detector,
+            raw_value_cls=raw_value_classes[options["source"]],
+            workers=options.get("workers"),
+            max_difference_to_skip=settings.MAX_DIFFERENCE_TO_SKIP,
+        )
+        print(f"Running {backtest}")
+        result = backtest.run(options.get("date_from"), options.get("date_to"))
+        result.to_csv(options["output"], index=False)
+
+        total = len(result)
+        anomalies = int(result["anomaly"].sum())
+        print(f"Windows: {total}, anomalies: {anomalies} ({anomalies / total if total else 0:.2%})")
+        print(f"Results written to {options['output']}")
@@ -2,6 +2,7 @@ import time as systime
 from argparse import ArgumentParser
 from datetime import datetime, timedelta
 
+from detector import settings
 from detector.collectors.base_collector import BaseCollector
 from detector.data_getter import ProcessGetter
 from detector.db import RawCleanedValue
@@ -13,26 +14,65 @@ class CollectCommand(BaseCommand):
     description = "Data collect process"
 
     def add_arguments(self, parser: ArgumentParser):
-        parser.add_argument("--collector", help="Type of collector", default="csv", choices=["csv", "db"])
-        parser.add_argument("--collector_filename", help="File name for csv collector", type=str)
+        parser.add_argument("--collector", help="Type of collector", default="csv", choices=list(settings.COLLECTORS))
+        parser.add_argument(
+            "--collector_filename", help="File name for csv collector, directory for parquet collector", type=str
+        )
+        parser.add_argument(
+            "--collector_buffer_size",
+            help="Snapshots written at once by db and parquet collectors",
+            type=int,
+            default=settings.COLLECTOR_BUFFER_SIZE,
+        )
+        parser.add_argument(
+            "--collector_rotate_minutes",
+            help="Minutes of snapshots in one parquet segment",
+            type=int,
+            default=settings.COLLECTOR_ROTATE_MINUTES,
+        )
+        parser.add_argument(
+            "--collector_rotate_mb",
+            help="Size of a parquet segment in megabytes after which a new one is started",
+            type=int,
+            default=settings.COLLECTOR_ROTATE_MB,
+        )
+        parser.add_argument(
+            "--data_getter",
+            help="Processes reader, procfs reads /proc directly on Linux",
+            default=settings.DATA_GETTER,
+            choices=list(settings.DATA_GETTERS),
+        )
+        parser.add_argument(
+            "--expensive_attrs_interval",
+            help="Collect connections and open files every N snapshots, new processes get them at once",
+            type=int,
+            default=settings.EXPENSIVE_ATTRS_INTERVAL,
+        )
 
     def handle(self, *args, **options):
         options["raw_values_cls"] = RawCleanedValue
 
         collector: BaseCollector = self.get_instance("collector", options, instance_kwargs={"verbose": True})
-        process_getter = ProcessGetter()
+        process_getter: ProcessGetter = self.get_instance("data_getter", options)
 
         print("Starting collector service.")
         print(f"Using collector: {collector}")
+        print(f"Using data getter: {process_getter}")
 
         print("Collecting...")
 
         next_run_at = datetime.now()
 
-        while True:
-            next_run_at = next_run_at + timedelta(seconds=60)
-            dttm, data = process_getter.get_data()
-            collector.collect(data)
-            print("Sleeping...")
-            sleep_secs = (next_run_at - datetime.now()).total_seconds()
-            systime.sleep(sleep_secs)
+        try:
+            while True:
+                next_run_at = next_run_at + timedelta(seconds=60)
+                dttm, data = process_getter.get_data()
+                collector.collect(data)
+                print("Sleeping...")
+                sleep_secs = (next_run_at - datetime.now()).total_seconds()
+                systime.sleep(max(sleep_secs, 0))
+        except KeyboardInterrupt:
+            print("Stopping collector service.")
+        finally:
+            # Buffered snapshots are not lost on shutdown.
+            collector.flush()
@@ -1,5 +1,5 @@
 import time as systime
-from argparse import ArgumentParser
+from argparse import ArgumentParser, BooleanOptionalAction
 from datetime import datetime, timedelta
 
 from detector import settings
@@ -27,7 +27,43 @@ class DetectCommand(BaseCommand):
             choices=["console", "db", "file"],
         )
         parser.add_argument("--detector_file", help="Detector file", type=str, default=None)
+        parser.add_argument(
+            "--train_file",
+            help="Csv file or parquet directory with collected processes to fit on",
+            type=str,
+            default=None,
+        )
         parser.add_argument("--verbose", help="Print additional info", default=False, type=bool)
+        parser.add_argument(
+            "--data_getter",
+            help="Processes reader, procfs reads /proc directly on Linux",
+            default=settings.DATA_GETTER,
+            choices=list(settings.DATA_GETTERS),
+        )
+        parser.add_argument(
+            "--expensive_attrs_interval",
+            help="Collect connections and open files every N snapshots, new processes get them at once",
+            type=int,
+            default=settings.EXPENSIVE_ATTRS_INTERVAL,
+        )
+        parser.add_argument(
+            "--collector_buffer_size",
+            help="Snapshots saved to the database in one transaction",
+            type=int,
+            default=settings.COLLECTOR_BUFFER_SIZE,
+        )
+        parser.add_argument(
+            "--collect",
+            help="Save collected processes to the database",
+            default=True,
+            action=BooleanOptionalAction,
+        )
+        parser.add_argument(
+            "--stop_timeout",
+            help="Seconds to wait for queued snapshots and anomalies on stop",
+            type=float,
+            default=settings.DETECTOR_STOP_TIMEOUT,
+        )
 
     def handle(self, *args, **options):
 
@@ -43,15 +79,29 @@ class DetectCommand(BaseCommand):
             verbose=verbose,
             detector_file=detector_file,
             min_normal_state_difference=settings.MAX_DIFFERENCE_TO_SKIP,
+            collect=options.get("collect", True),
+            train_file=options.get("train_file"),
+            data_getter=self.get_instance("data_getter", options),
+            collector_buffer_size=options.get("collector_buffer_size", settings.COLLECTOR_BUFFER_SIZE),
         )
 
         print("Detector service started.")
 
         next_run_at = datetime.now()
 
-        while True:
-            next_run_at = next_run_at + timedelta(seconds=60)
-            detect_process.run()
-            print("Sleeping...")
-            sleep_secs = (next_run_at - datetime.now()).total_seconds()
-            systime.sleep(sleep_secs)
+        try:
+            while True:
+                next_run_at = next_run_at + timedelta(seconds=60)
+                detect_process.run()
+                sleep_secs = (next_run_at - datetime.now()).total_seconds()
+                if sleep_secs < 0:
+                    print(f"Run is {-sleep_secs:.1f} seconds late, next run starts now.")
+                    next_run_at = datetime.now() - timedelta(seconds=60)
+                    continue
+                print("Sleeping...")
+                systime.sleep(sleep_secs)
+        except KeyboardInterrupt:
+            print("Stopping detector service.")
+        finally:
+            detect_process.stop(options.get("stop_timeout", settings.DETECTOR_STOP_TIMEOUT))
+            print("Detector service stopped.")
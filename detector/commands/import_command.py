@@ -1,97 +1,113 @@
+import os
 from argparse import ArgumentParser
 from curses import window, wrapper
+from itertools import islice
+from typing import Iterator
 
-import numpy as np
 import pandas as pd
 
-from detector.db import RawCleanedValue, session_scope
+from detector.data_getter.process_getter import COLUMNS
+from detector.db import AggregatedWindow, RawCleanedValue, bulk_insert, session_scope
 
 from .base_command import BaseCommand
 
+CHUNK_SIZE = 10_000
+
+
+def read_csv_chunks(filename: str, chunk_size: int = CHUNK_SIZE) -> Iterator[tuple[pd.DataFrame, float]]:
+    # Yields chunks with the read part of the file, the parser reads ahead so the progress is approximate.
+    size = os.path.getsize(filename) or 1
+    with open(filename, "rb") as file:
+        for chunk in pd.read_csv(file, names=COLUMNS, chunksize=chunk_size):
+            yield chunk, min(file.tell() / size, 1)
+
+
+def read_xlsx_chunks(filename: str, chunk_size: int = CHUNK_SIZE) -> Iterator[tuple[pd.DataFrame, float]]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(filename, read_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        total_rows = max((sheet.max_row or 1) - 1, 1)
+        # The first row is the header, the columns are taken by position like in the csv files.
+        rows = sheet.iter_rows(min_row=2, values_only=True)
+        read_rows = 0
+        while chunk := list(islice(rows, chunk_size)):
+            read_rows += len(chunk)
+            yield pd.DataFrame([row[: len(COLUMNS)] for row in chunk], columns=COLUMNS), min(read_rows / total_rows, 1)
+    finally:
+        workbook.close()
+
+
+def read_parquet_chunks(directory: str, chunk_size: int = CHUNK_SIZE) -> Iterator[tuple[pd.DataFrame, float]]:
+    from detector.collectors.parquet_collector import get_segments, read_segments
+
+    total_rows = sum(segment["rows"] for segment in get_segments(directory)) or 1
+    read_rows = 0
+    for chunk in read_segments(directory, COLUMNS, batch_size=chunk_size):
+        read_rows += len(chunk)
+        yield chunk, min(read_rows / total_rows, 1)
+
 
 class ImportCommand(BaseCommand):
     description = "Import data helper"
 
     def add_arguments(self, parser: ArgumentParser):
-        parser.add_argument("--file_type", help="Type of file", default="csv", choices=["csv", "xlsx"])
+        parser.add_argument("--file_type", help="Type of file", default="csv", choices=["csv", "xlsx", "parquet"])
         parser.add_argument("--filename", help="File name", type=str, required=True)
         parser.add_argument("--drop_previous", help="Drop previous rows", type=bool, default=False)
+        parser.add_argument("--chunk_size", help="Rows read and inserted at once", type=int, default=CHUNK_SIZE)
 
-    def _handle(self, stdscr: window, read_func, filename, drop_previous=False):
+    def _handle(self, stdscr: window, read_func, filename, drop_previous=False, chunk_size=CHUNK_SIZE):
         stdscr.clear()
         stdscr.refresh()
         rows, cols = stdscr.getmaxyx()
 
         row_pos = round(rows / 2)
 
+        # TODO check for duplicates
+        if drop_previous:
+            stdscr.addstr(row_pos, 0, "Dropping previous...")
+            stdscr.refresh()
+            # Materialized windows of the dropped rows are dropped with them.
+            with session_scope() as session:
+                session.query(RawCleanedValue).delete()
+                session.query(AggregatedWindow).delete()
+
         stdscr.addstr(row_pos, 0, "Reading file...")
         stdscr.refresh()
 
-        df = read_func(
-            filename,
-            names=[
-                "dttm",
-                "pid",
-                "name",
-                "username",
-                "ppid",
-                "parent_name",
-                "cpu_percent",
-                "memory_percent",
-                "num_threads",
-                "terminal",
-                "nice",
-                "cmdline",
-                "exe",
-                "status",
-                "create_time",
-                "connections",
-                "open_files",
-            ],
-        )
-
-        with session_scope() as session:
-            # TODO check for duplicates
-            if drop_previous:
-                stdscr.addstr(row_pos, 0, "Dropping previous...")
-                stdscr.refresh()
-                with session.begin():
-                    session.query(RawCleanedValue).delete()
-            df.dttm = pd.to_datetime(df.dttm, unit="s")
-            df.create_time = pd.to_datetime(df.create_time, unit="s")
-            total_rows = len(df)
-            chunks = np.array_split(df.to_dict("records"), int(total_rows / 10000) + 1)
-            del df
-            added_rows = 0
-            MAX_SPACES = cols - 10 - len(str(total_rows)) * 2 - len("Importing ")
-            stdscr.addstr(row_pos, 0, "Importing...")
+        # Only one chunk is in memory at a time, every chunk is inserted in its own transaction.
+        added_rows = 0
+        MAX_SPACES = cols - 20 - len("Importing ")
+        for chunk, progress in read_func(filename, chunk_size):
+            chunk = chunk.assign(
+                dttm=pd.to_datetime(chunk.dttm, unit="s"), create_time=pd.to_datetime(chunk.create_time, unit="s")
+            )
+            with session_scope() as session:
+                added_rows += bulk_insert(session, RawCleanedValue, chunk)
+            progress = round(progress * MAX_SPACES)
+            stdscr.addstr(
+                row_pos,
+                0,
+                "Importing [" + "=" * progress + ">" + " " * (MAX_SPACES - progress) + f"] {added_rows}",
+            )
             stdscr.refresh()
-            for chunk in chunks:
-                with session.begin():
-                    session.add_all([RawCleanedValue(**kwargs) for kwargs in chunk])
-                    added_rows += len(chunk)
-                    progress = round((added_rows / total_rows) * MAX_SPACES)
-                    stdscr.addstr(
-                        row_pos,
-                        0,
-                        "Importing ["
-                        + "=" * progress
-                        + ">"
-                        + " " * (MAX_SPACES - progress)
-                        + f"] {added_rows} / {total_rows}",
-                    )
-                    stdscr.refresh()
-
-        stdscr.addstr(row_pos, 0, f"Successfully imported {total_rows} rows.")
+
+        stdscr.move(row_pos, 0)
+        stdscr.clrtoeol()
+        stdscr.addstr(row_pos, 0, f"Successfully imported {added_rows} rows.")
         stdscr.refresh()
 
     def handle(self, *args, **options):
         readers = {
-            "csv": pd.read_csv,
-            "xlsx": pd.read_excel,
+            "csv": read_csv_chunks,
+            "xlsx": read_xlsx_chunks,
+            "parquet": read_parquet_chunks,
         }
         file_type = options["file_type"]
         drop_previous = options.get("drop_previous", False)
         filename = options["filename"]
+        chunk_size = options.get("chunk_size") or CHUNK_SIZE
 
-        wrapper(self._handle, readers[file_type], filename, drop_previous=drop_previous)
+        wrapper(self._handle, readers[file_type], filename, drop_previous=drop_previous, chunk_size=chunk_size)
@@ -0,0 +1,43 @@
+from argparse import ArgumentParser
+
+from detector import settings
+from detector.db import RawCleanedValue, RawValue
+from detector.db.retention import apply_retention
+
+from .base_command import BaseCommand
+
+
+class RetentionCommand(BaseCommand):
+    description = "Replace old raw values with per-minute rollups"
+
+    def add_arguments(self, parser: ArgumentParser):
+        parser.add_argument(
+            "--source",
+            help="Tables to apply retention to",
+            nargs="+",
+            default=["raw_values"],
+            choices=["raw_values", "raw_cleaned_values"],
+        )
+        parser.add_argument(
+            "--keep_days",
+            help="Whole days of raw values to keep",
+            type=int,
+            default=settings.RETENTION_DAYS,
+        )
+        parser.add_argument(
+            "--partitions_ahead",
+            help="Days of partitions created in advance on PostgreSQL",
+            type=int,
+            default=2,
+        )
+
+    def handle(self, *args, **options):
+        raw_value_classes = {
+            "raw_cleaned_values": RawCleanedValue,
+            "raw_values": RawValue,
+        }
+        for source in options["source"]:
+            rollups, removed = apply_retention(
+                raw_value_classes[source], options["keep_days"], partitions_ahead=options["partitions_ahead"]
+            )
+            print(f"{source}: removed {removed} raw values, written {rollups} rollups")
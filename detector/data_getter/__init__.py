@@ -1 +1,2 @@
 from .process_getter import ProcessGetter
+from .procfs_getter import ProcFSGetter
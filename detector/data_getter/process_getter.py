@@ -7,92 +7,145 @@ import psutil as ps
 
 from detector import settings
 
+ATTRS = [
+    "pid",
+    "name",
+    "username",
+    "terminal",
+    "num_threads",
+    "nice",
+    "exe",
+    "memory_percent",
+    "cmdline",
+    "create_time",
+    "connections",
+    "status",
+    "cpu_percent",
+    "ppid",
+    "open_files",
+]
+
+# Attributes which do not change during the life of a process, they are read once per process.
+STATIC_ATTRS = ["username", "exe", "cmdline", "create_time"]
+
+# Attributes which need every fd of a process and the socket tables, they may be collected less often.
+EXPENSIVE_ATTRS = ["connections", "open_files"]
+
+COLUMNS = [
+    "dttm",
+    "pid",
+    "name",
+    "username",
+    "ppid",
+    "parent_name",
+    "cpu_percent",
+    "memory_percent",
+    "num_threads",
+    "terminal",
+    "nice",
+    "cmdline",
+    "exe",
+    "status",
+    "create_time",
+    "connections",
+    "open_files",
+]
+
 
 class ProcessGetter:
     _current_pid: int
+    _expensive_attrs_interval: int
+    _expensive_attrs: dict[tuple[int, float], dict]
+    _handles: dict[int, tuple[ps.Process, dict]]
+    _ticks: int = 0
 
-    def __init__(self) -> None:
+    def __init__(self, expensive_attrs_interval: int = 1) -> None:
         self._current_pid = threading.current_thread().native_id
+        self._expensive_attrs_interval = max(int(expensive_attrs_interval or 1), 1)
+        self._expensive_attrs = {}
+        self._handles = {}
+
+    @property
+    def _expensive_attrs_due(self) -> bool:
+        return self._ticks % self._expensive_attrs_interval == 0
 
-    def _enrich_process(self, process: ps.Process) -> dict:
-        process = process.info
-        process["open_files"] = len(process["open_files"]) if process["open_files"] else 0
-        process["connections"] = len(process["connections"]) if process["connections"] else 0
+    def _need_expensive_attrs(self, pid: int, create_time: float) -> bool:
+        # Processes seen for the first time get every attribute, the known ones only every interval ticks.
+        return self._expensive_attrs_due or (pid, create_time) not in self._expensive_attrs
+
+    def _carry_expensive_attrs(self, processes: list[dict]) -> list[dict]:
+        expensive_attrs = {}
+        for process in processes:
+            key = (process["pid"], process["create_time"])
+            if EXPENSIVE_ATTRS[0] not in process:
+                process.update(self._expensive_attrs[key])
+            expensive_attrs[key] = {attr: process[attr] for attr in EXPENSIVE_ATTRS}
+        self._expensive_attrs = expensive_attrs
+        return processes
+
+    def _enrich_process(self, process: dict, names: dict[int, str]) -> dict:
+        if EXPENSIVE_ATTRS[0] in process:
+            process["open_files"] = len(process["open_files"]) if process["open_files"] else 0
+            process["connections"] = len(process["connections"]) if process["connections"] else 0
         process["cmdline"] = " ".join(process["cmdline"]) if process["cmdline"] else None
-        try:
-            parent_name = ps.Process(process["ppid"]).name()
-        except BaseException:
-            parent_name = None
+        parent_name = names.get(process["ppid"])
+        if parent_name is None:
+            try:
+                parent_name = ps.Process(process["ppid"]).name()
+            except BaseException:
+                parent_name = None
         process["parent_name"] = parent_name
 
         return process
 
-    def get_data(self) -> tuple[datetime, pd.DataFrame]:
-        dttm = datetime.now().timestamp()
-
-        def _filter_process(process: ps.Process) -> bool:
-            process = process.info
-            return not (
-                process["pid"] == self._current_pid
-                or (settings.EXCLUDE_EXE and re.match(settings.EXCLUDE_EXE, process["exe"]))
-                or (
-                    settings.EXCLUDE_COMMAND
-                    and process["cmdline"]
-                    and re.match(settings.EXCLUDE_COMMAND, " ".join(process["cmdline"]))
-                )
-                or (settings.EXCLUDE_NAME and process["name"] and re.match(settings.EXCLUDE_NAME, process["name"]))
-            )
-
-        processes = list(
-            map(
-                self._enrich_process,
-                filter(
-                    _filter_process,
-                    ps.process_iter(
-                        [
-                            "pid",
-                            "name",
-                            "username",
-                            "terminal",
-                            "num_threads",
-                            "nice",
-                            "exe",
-                            "memory_percent",
-                            "cmdline",
-                            "create_time",
-                            "connections",
-                            "status",
-                            "cpu_percent",
-                            "ppid",
-                            "open_files",
-                        ]
-                    ),
-                ),
+    def _filter_process(self, process: dict) -> bool:
+        return not (
+            process["pid"] == self._current_pid
+            or (settings.EXCLUDE_EXE and re.match(settings.EXCLUDE_EXE, process["exe"]))
+            or (
+                settings.EXCLUDE_COMMAND
+                and process["cmdline"]
+                and re.match(settings.EXCLUDE_COMMAND, " ".join(process["cmdline"]))
             )
+            or (settings.EXCLUDE_NAME and process["name"] and re.match(settings.EXCLUDE_NAME, process["name"]))
         )
 
-        df = pd.DataFrame(
-            data=processes,
-            columns=[
-                "dttm",
-                "pid",
-                "name",
-                "username",
-                "ppid",
-                "parent_name",
-                "cpu_percent",
-                "memory_percent",
-                "num_threads",
-                "terminal",
-                "nice",
-                "cmdline",
-                "exe",
-                "status",
-                "create_time",
-                "connections",
-                "open_files",
-            ],
-        ).fillna(0)
+    def _get_handle(self, pid: int) -> tuple[ps.Process, dict]:
+        handle, static_attrs = self._handles.get(pid, (None, None))
+        # is_running compares pid and create time, so a reused pid gets a new handle. Kept handles remember
+        # the previous cpu times, so cpu_percent is measured between snapshots.
+        if handle is None or not handle.is_running():
+            handle = ps.Process(pid)
+            static_attrs = handle.as_dict(STATIC_ATTRS, ad_value=None)
+        return handle, static_attrs
+
+    def _get_processes(self) -> list[dict]:
+        dynamic_attrs = [attr for attr in ATTRS if attr not in STATIC_ATTRS + EXPENSIVE_ATTRS]
+        handles = {}
+        processes = []
+        for pid in ps.pids():
+            if pid == self._current_pid:
+                continue
+            try:
+                handle, static_attrs = handles[pid] = self._get_handle(pid)
+                attrs = dynamic_attrs
+                if self._need_expensive_attrs(pid, static_attrs["create_time"]):
+                    attrs = attrs + EXPENSIVE_ATTRS
+                processes.append({**handle.as_dict(attrs, ad_value=None), **static_attrs})
+            except ps.NoSuchProcess:
+                continue
+        # Handles of exited processes are dropped.
+        self._handles = handles
+
+        names = {process["pid"]: process["name"] for process in processes}
+        return [self._enrich_process(process, names) for process in processes if self._filter_process(process)]
+
+    def get_data(self) -> tuple[datetime, pd.DataFrame]:
+        dttm = datetime.now().timestamp()
+
+        processes = self._carry_expensive_attrs(self._get_processes())
+        self._ticks += 1
+        df = pd.DataFrame(data=processes, columns=COLUMNS).fillna(0)
 
         df["dttm"] = dttm
 
@@ -0,0 +1,201 @@
+import os
+import pwd
+import time
+from functools import cache
+from glob import glob
+from typing import Callable, Optional
+
+import psutil as ps
+
+from .process_getter import EXPENSIVE_ATTRS, ProcessGetter
+
+PROC_STATUSES = {
+    "R": ps.STATUS_RUNNING,
+    "S": ps.STATUS_SLEEPING,
+    "D": ps.STATUS_DISK_SLEEP,
+    "T": ps.STATUS_STOPPED,
+    "t": ps.STATUS_TRACING_STOP,
+    "Z": ps.STATUS_ZOMBIE,
+    "X": ps.STATUS_DEAD,
+    "x": ps.STATUS_DEAD,
+    "K": "wake-kill",
+    "W": ps.STATUS_WAKING,
+    "I": ps.STATUS_IDLE,
+    "P": ps.STATUS_PARKED,
+}
+
+# Positions in /proc/<pid>/stat after the command name, the first one is the state (field 3 in proc(5)).
+STATE, PPID, TTY_NR, UTIME, STIME, NICE, NUM_THREADS, STARTTIME, RSS = 0, 1, 4, 11, 12, 16, 17, 19, 21
+
+INET_TABLES = ["tcp", "tcp6", "udp", "udp6"]
+
+
+class ProcFSGetter(ProcessGetter):
+    # Reads /proc directly: stat, status, cmdline and the fd links once per pid, and the socket tables and
+    # the terminal map once per snapshot. Values match the psutil based getter.
+    _procfs_path: str
+    _cpu_times: dict[tuple[int, str], tuple[float, float]]
+    _usernames: dict[int, str]
+
+    def __init__(self, expensive_attrs_interval: int = 1, procfs_path: str = "/proc") -> None:
+        super().__init__(expensive_attrs_interval)
+        self._procfs_path = procfs_path
+        self._cpu_times = {}
+        self._usernames = {}
+        self._clock_ticks = os.sysconf("SC_CLK_TCK")
+        self._page_size = os.sysconf("SC_PAGE_SIZE")
+
+    def _read(self, pid: int, name: str, mode: str = "r"):
+        with open(f"{self._procfs_path}/{pid}/{name}", mode) as file:
+            return file.read()
+
+    def _get_username(self, uid: int) -> str:
+        if uid not in self._usernames:
+            try:
+                self._usernames[uid] = pwd.getpwuid(uid).pw_name
+            except KeyError:
+                self._usernames[uid] = str(uid)
+        return self._usernames[uid]
+
+    def _get_boot_time(self) -> float:
+        with open(f"{self._procfs_path}/stat") as file:
+            for line in file:
+                if line.startswith("btime"):
+                    return float(line.split()[1])
+
+    def _get_total_memory(self) -> int:
+        with open(f"{self._procfs_path}/meminfo") as file:
+            for line in file:
+                if line.startswith("MemTotal:"):
+                    return int(line.split()[1]) * 1024
+
+    def _get_socket_inodes(self) -> set[str]:
+        inodes = set()
+        for table in INET_TABLES:
+            try:
+                with open(f"{self._procfs_path}/net/{table}") as file:
+                    next(file, None)
+                    inodes.update(line.split()[9] for line in file)
+            except FileNotFoundError:
+                continue
+        return inodes
+
+    @staticmethod
+    def _get_terminal_map() -> dict[int, str]:
+        terminals = {}
+        for path in glob("/dev/tty*") + glob("/dev/pts/*"):
+            try:
+                terminals[os.stat(path).st_rdev] = path
+            except OSError:
+                continue
+        return terminals
+
+    def _get_fds(self, pid: int, socket_inodes: set[str]) -> tuple[Optional[int], Optional[int]]:
+        try:
+            fds = os.listdir(f"{self._procfs_path}/{pid}/fd")
+        except PermissionError:
+            return None, None
+        open_files = connections = 0
+        for fd in fds:
+            try:
+                path = os.readlink(f"{self._procfs_path}/{pid}/fd/{fd}")
+            except OSError:
+                continue
+            if path.startswith("socket:["):
+                connections += path[len("socket:[") : -1] in socket_inodes  # noqa: E203
+            elif path.startswith("/") and os.path.isfile(path):
+                open_files += 1
+        return open_files, connections
+
+    def _get_exe(self, pid: int) -> Optional[str]:
+        try:
+            exe = os.readlink(f"{self._procfs_path}/{pid}/exe")
+        except PermissionError:
+            return None
+        except FileNotFoundError:
+            return ""
+        exe = exe.split("\x00")[0]
+        if exe.endswith(" (deleted)") and not os.path.exists(exe):
+            exe = exe[: -len(" (deleted)")]
+        return exe
+
+    def _get_cmdline(self, pid: int) -> list[str]:
+        data = self._read(pid, "cmdline", "rb").decode(errors="surrogateescape")
+        if not data:
+            return []
+        sep = "\x00" if data.endswith("\x00") or " " not in data else " "
+        return data.rstrip(sep).split(sep)
+
+    def _get_process(
+        self,
+        pid: int,
+        boot_time: float,
+        total_memory: int,
+        socket_inodes: Callable[[], set[str]],
+        terminals: dict[int, str],
+        cpu_times: dict[tuple[int, str], tuple[float, float]],
+    ) -> dict:
+        stat = self._read(pid, "stat", "rb").decode(errors="surrogateescape")
+        name, fields = stat[stat.find("(") + 1 : stat.rfind(")")], stat[stat.rfind(")") + 2 :].split()  # noqa: E203
+        uid = int(self._read(pid, "status").split("\nUid:", 1)[1].split()[0])
+        cmdline = self._get_cmdline(pid)
+        if len(name) >= 15 and cmdline:
+            extended_name = os.path.basename(cmdline[0])
+            if extended_name.startswith(name):
+                name = extended_name
+
+        # cpu_percent is computed like psutil: process cpu time since the previous snapshot divided by
+        # the wall time, and 0 for processes seen for the first time.
+        cpu_time = (int(fields[UTIME]) + int(fields[STIME])) / self._clock_ticks
+        now = time.monotonic()
+        previous = cpu_times.get((pid, fields[STARTTIME]))
+        self._cpu_times[(pid, fields[STARTTIME])] = (cpu_time, now)
+        cpu_percent = round((cpu_time - previous[0]) / (now - previous[1]) * 100, 1) if previous else 0.0
+
+        process = {
+            "pid": pid,
+            "name": name,
+            "username": self._get_username(uid),
+            "terminal": terminals.get(int(fields[TTY_NR])),
+            "num_threads": int(fields[NUM_THREADS]),
+            "nice": int(fields[NICE]),
+            "exe": self._get_exe(pid),
+            "memory_percent": int(fields[RSS]) * self._page_size / total_memory * 100,
+            "cmdline": cmdline,
+            "create_time": int(fields[STARTTIME]) / self._clock_ticks + boot_time,
+            "status": PROC_STATUSES.get(fields[STATE], "?"),
+            "cpu_percent": cpu_percent,
+            "ppid": int(fields[PPID]),
+        }
+        if self._need_expensive_attrs(pid, process["create_time"]):
+            process["open_files"], process["connections"] = self._get_fds(pid, socket_inodes())
+        return process
+
+    def _get_processes(self) -> list[dict]:
+        boot_time, total_memory = self._get_boot_time(), self._get_total_memory()
+        socket_inodes, terminals = cache(self._get_socket_inodes), self._get_terminal_map()
+
+        # Cpu times of processes which are gone are dropped with the previous snapshot.
+        cpu_times, self._cpu_times = self._cpu_times, {}
+        processes = []
+        for pid in sorted(int(entry) for entry in os.listdir(self._procfs_path) if entry.isdigit()):
+            try:
+                processes.append(self._get_process(pid, boot_time, total_memory, socket_inodes, terminals, cpu_times))
+            except (FileNotFoundError, ProcessLookupError):
+                # The process exited while it was read.
+                continue
+
+        # Parent names come from the same snapshot instead of a psutil.Process per parent.
+        names = {process["pid"]: process["name"] for process in processes}
+        for process in processes:
+            process["parent_name"] = names.get(process["ppid"])
+            for attr in EXPENSIVE_ATTRS:
+                if attr in process:
+                    process[attr] = process[attr] or 0
+        processes = [process for process in processes if self._filter_process(process)]
+        for process in processes:
+            process["cmdline"] = " ".join(process["cmdline"]) if process["cmdline"] else None
+        return processes
+
+    def __str__(self) -> str:
+        return "ProcFSGetter"
@@ -1,6 +1,9 @@
+from .aggregated_window import AggregatedWindow
 from .anomaly_log import AnomalyLog
 from .base import Base, BaseRawValue
-from .helpers import extract_time, get_engine, string_agg
+from .bulk import bulk_insert
+from .helpers import extract_time, get_engine, string_agg, truncate_minute
 from .raw_cleaned_value import RawCleanedValue
 from .raw_value import RawValue
+from .raw_value_rollup import RawValueRollup
 from .session import Session, session_scope
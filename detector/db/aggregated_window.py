@@ -0,0 +1,15 @@
+from sqlalchemy import JSON, Column, DateTime, Integer, String, UniqueConstraint
+
+from .base import Base
+
+
+class AggregatedWindow(Base):
+    __tablename__ = "aggregated_windows"
+    __table_args__ = (UniqueConstraint("settings_hash", "dttm"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    settings_hash = Column(String(64), nullable=False)
+    dttm = Column(DateTime, nullable=False)
+    features = Column(JSON, nullable=False)
+    # The last id of raw values when the window was computed.
+    raw_max_id = Column(Integer, nullable=True)
@@ -7,5 +7,5 @@ class AnomalyLog(Base):
     __tablename__ = "anomaly_logs"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    dttm = Column(DateTime)
+    dttm = Column(DateTime, index=True)
     reason = Column(String)
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, DateTime, Float, Integer, String
-from sqlalchemy.orm import declarative_base
+from sqlalchemy import Column, DateTime, Float, Index, Integer, String
+from sqlalchemy.orm import declarative_base, declared_attr
 
 Base = declarative_base()
 
@@ -7,8 +7,29 @@ Base = declarative_base()
 class BaseRawValue(Base):
     __abstract__ = True
 
+    @declared_attr
+    def __table_args__(cls):
+        # Windows are aggregated by pid and username inside a dttm range, the web app reads dttm ranges.
+        # PostgreSQL also gets the aggregated fields in the index for index-only scans.
+        return (
+            Index(
+                f"ix_{cls.__tablename__}_dttm_pid_username",
+                "dttm",
+                "pid",
+                "username",
+                postgresql_include=[
+                    "cpu_percent",
+                    "memory_percent",
+                    "num_threads",
+                    "connections",
+                    "open_files",
+                    "status",
+                ],
+            ),
+        )
+
     id = Column(Integer, primary_key=True, autoincrement=True)
-    dttm = Column(DateTime, index=True)
+    dttm = Column(DateTime)
     pid = Column(Integer)
     name = Column(String(512))
     username = Column(String(256))
@@ -0,0 +1,38 @@
+from contextlib import closing
+from io import StringIO
+
+import pandas as pd
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+BULK_INSERT_BATCH_SIZE = 10_000
+
+
+def _copy_from(connection, table_name: str, data: pd.DataFrame) -> bool:  # pragma: no cover
+    # COPY needs psycopg2, other PostgreSQL drivers fall back to executemany.
+    with closing(connection.connection.cursor()) as cursor:
+        if not hasattr(cursor, "copy_expert"):
+            return False
+        buffer = StringIO()
+        data.to_csv(buffer, header=False, index=False)
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY {table_name} ({', '.join(data.columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    return True
+
+
+def bulk_insert(session: Session, table_cls, data: pd.DataFrame, batch_size: int = BULK_INSERT_BATCH_SIZE) -> int:
+    # Rows are written in the session transaction without ORM objects: COPY on PostgreSQL with psycopg2,
+    # executemany of a Core insert in batches otherwise.
+    table = table_cls.__table__
+    data = data[[column.name for column in table.columns if column.name in data.columns]]
+    if data.empty:
+        return 0
+
+    connection = session.connection()
+    if connection.dialect.name == "postgresql" and _copy_from(connection, table.name, data):  # pragma: no cover
+        return len(data)
+
+    statement = insert(table)
+    for start in range(0, len(data), batch_size):
+        connection.execute(statement, data.iloc[start : start + batch_size].to_dict("records"))  # noqa: E203
+    return len(data)
@@ -39,3 +39,11 @@ def string_agg(expr, sep=",", db_prefix=DB_PREFIX):  # pragma: no cover
         return func.group_concat(expr, literal_column(f"'{sep}'"))
 
     return func.string_agg(expr, literal_column(f"'{sep}'"))
+
+
+def truncate_minute(expr, db_prefix=DB_PREFIX):  # pragma: no cover
+    if "sqlite" in db_prefix:
+        # The same text format as the stored DateTime values, so they are compared as strings.
+        return func.strftime("%Y-%m-%d %H:%M:00.000000", expr)
+
+    return func.date_trunc("minute", expr)
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, DateTime, Float, Index, Integer, String
+
+from .base import Base
+
+
+class RawValueRollup(Base):
+    __tablename__ = "raw_value_rollups"
+    __table_args__ = (Index("ix_raw_value_rollups_source_dttm", "source", "dttm"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    source = Column(String(64), nullable=False)
+    dttm = Column(DateTime, nullable=False)
+    username = Column(String(256))
+    name = Column(String(512))
+    processes = Column(Integer)
+    cpu_percent_avg = Column(Float)
+    cpu_percent_max = Column(Float)
+    memory_percent_avg = Column(Float)
+    memory_percent_max = Column(Float)
+    num_threads_avg = Column(Float)
+    connections_avg = Column(Float)
+    open_files_avg = Column(Float)
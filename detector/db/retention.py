@@ -0,0 +1,169 @@
+from datetime import datetime, timedelta
+from typing import Optional, Type, Union
+
+from sqlalchemy import MetaData, Table, distinct, func, insert, literal, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from .base import Base, BaseRawValue
+from .helpers import truncate_minute
+from .raw_cleaned_value import RawCleanedValue
+from .raw_value import RawValue
+from .raw_value_rollup import RawValueRollup
+from .session import session_scope
+
+RAW_VALUE_CLASSES = [RawValue, RawCleanedValue]
+PARTITION_INTERVAL = timedelta(days=1)
+
+
+def floor_partition(dttm: datetime) -> datetime:
+    return datetime(dttm.year, dttm.month, dttm.day)
+
+
+def _partitioned_table(table: Table) -> Table:  # pragma: no cover
+    # PostgreSQL requires the partition key in the primary key of a partitioned table.
+    columns = [column._copy() for column in table.columns]
+    for column in columns:
+        if column.name == "dttm":
+            column.primary_key = True
+            column.nullable = False
+    return Table(table.name, MetaData(), *columns, postgresql_partition_by="RANGE (dttm)")
+
+
+def create_tables(connection: Connection) -> None:
+    # On PostgreSQL raw values tables are partitioned by day, rows outside of the created partitions
+    # go to the default one. Existing tables only get the missing indexes.
+    if connection.dialect.name == "postgresql":  # pragma: no cover
+        for raw_value_cls in RAW_VALUE_CLASSES:
+            name = raw_value_cls.__tablename__
+            _partitioned_table(raw_value_cls.__table__).create(connection, checkfirst=True)
+            if is_partitioned(connection, raw_value_cls):
+                connection.execute(text(f"CREATE TABLE IF NOT EXISTS {name}_default PARTITION OF {name} DEFAULT"))
+                create_partitions(connection, raw_value_cls, datetime.now(), datetime.now() + PARTITION_INTERVAL)
+    Base.metadata.create_all(connection)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+def is_partitioned(session: Union[Session, Connection], raw_value_cls: Type[BaseRawValue]) -> bool:
+    dialect = session.dialect if isinstance(session, Connection) else session.get_bind().dialect
+    if dialect.name != "postgresql":
+        return False
+    return bool(  # pragma: no cover
+        session.execute(
+            text("SELECT count(*) FROM pg_partitioned_table WHERE partrelid = CAST(:name AS regclass)"),
+            {"name": raw_value_cls.__tablename__},
+        ).scalar()
+    )
+
+
+def get_partitions(
+    session: Union[Session, Connection], raw_value_cls: Type[BaseRawValue]
+) -> dict[str, datetime]:  # pragma: no cover
+    # Range partitions by the start of their range, the default partition is not included.
+    name = raw_value_cls.__tablename__
+    partitions = session.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:name AS regclass)"
+        ),
+        {"name": name},
+    ).scalars()
+    return {
+        partition: datetime.strptime(partition[len(f"{name}_p") :], "%Y%m%d")  # noqa: E203
+        for partition in partitions
+        if partition.startswith(f"{name}_p")
+    }
+
+
+def create_partitions(
+    session: Union[Session, Connection], raw_value_cls: Type[BaseRawValue], dttm_from: datetime, dttm_to: datetime
+) -> None:  # pragma: no cover
+    # PostgreSQL refuses a new range while the default partition holds rows of it, for example after the
+    # retention command did not run for a few days. A missing partition is created as a separate table, the rows
+    # of its range are moved from the default partition and the table is attached, all in the caller transaction.
+    name = raw_value_cls.__tablename__
+    existing = get_partitions(session, raw_value_cls)
+    partition_from = floor_partition(dttm_from)
+    while partition_from <= dttm_to:
+        partition = f"{name}_p{partition_from:%Y%m%d}"
+        partition_to = partition_from + PARTITION_INTERVAL
+        if partition not in existing:
+            # Attaching locks the default partition anyway, taking the lock first keeps concurrent inserts of the
+            # range waiting until the partition is attached.
+            session.execute(text(f"LOCK TABLE {name}_default"))
+            session.execute(text(f"CREATE TABLE {partition} (LIKE {name} INCLUDING DEFAULTS)"))
+            session.execute(
+                text(
+                    f"WITH moved AS (DELETE FROM {name}_default WHERE dttm >= :dttm_from AND dttm < :dttm_to "
+                    f"RETURNING *) INSERT INTO {partition} SELECT * FROM moved"
+                ),
+                {"dttm_from": partition_from, "dttm_to": partition_to},
+            )
+            session.execute(
+                text(
+                    f"ALTER TABLE {name} ATTACH PARTITION {partition} "
+                    f"FOR VALUES FROM ('{partition_from.isoformat()}') TO ('{partition_to.isoformat()}')"
+                )
+            )
+        partition_from = partition_to
+
+
+def write_rollups(session: Session, raw_value_cls: Type[BaseRawValue], dttm_to: datetime) -> int:
+    x = raw_value_cls
+    minute = truncate_minute(x.dttm)
+    query = (
+        select(
+            literal(x.__tablename__),
+            minute,
+            x.username,
+            x.name,
+            func.count(distinct(x.pid)),
+            func.avg(x.cpu_percent),
+            func.max(x.cpu_percent),
+            func.avg(x.memory_percent),
+            func.max(x.memory_percent),
+            func.avg(x.num_threads),
+            func.avg(x.connections),
+            func.avg(x.open_files),
+        )
+        .where(x.dttm < dttm_to)
+        .group_by(minute, x.username, x.name)
+    )
+    columns = [
+        "source",
+        "dttm",
+        "username",
+        "name",
+        "processes",
+        "cpu_percent_avg",
+        "cpu_percent_max",
+        "memory_percent_avg",
+        "memory_percent_max",
+        "num_threads_avg",
+        "connections_avg",
+        "open_files_avg",
+    ]
+    return session.execute(insert(RawValueRollup).from_select(columns, query)).rowcount
+
+
+def apply_retention(
+    raw_value_cls: Type[BaseRawValue], keep_days: int, now: Optional[datetime] = None, partitions_ahead: int = 2
+) -> tuple[int, int]:
+    # Raw values older than keep_days whole days are replaced with per-minute rollups in one transaction,
+    # so a run is never half applied and repeated runs do not duplicate rollups. Returns the number of
+    # written rollups and removed raw values.
+    now = now or datetime.now()
+    dttm_to = floor_partition(now - timedelta(days=keep_days))
+    with session_scope() as session:
+        removed = session.query(func.count(raw_value_cls.id)).filter(raw_value_cls.dttm < dttm_to).scalar()
+        rollups = write_rollups(session, raw_value_cls, dttm_to) if removed else 0
+        if is_partitioned(session, raw_value_cls):  # pragma: no cover
+            for partition, partition_from in get_partitions(session, raw_value_cls).items():
+                if partition_from + PARTITION_INTERVAL <= dttm_to:
+                    session.execute(text(f"DROP TABLE {partition}"))
+            create_partitions(session, raw_value_cls, now, now + timedelta(days=partitions_ahead))
+        # The rows left in the default partition, or all the old rows without partitions.
+        session.query(raw_value_cls).filter(raw_value_cls.dttm < dttm_to).delete(synchronize_session=False)
+    return rollups, removed
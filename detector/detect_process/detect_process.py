@@ -1,25 +1,39 @@
+import os
 from datetime import datetime
 from typing import Any, Optional
 
 import pandas as pd
 
-from detector.aggregator import Aggregator
+from detector.aggregator import Aggregator, FrameAggregator, WindowAggregator
 from detector.algorythm import AnomalyDetector, AnomalyException
 from detector.collectors import DBCollector
 from detector.data_getter import ProcessGetter
 from detector.db import RawValue
 from detector.loggers.base_logger import BaseAnomalyLogger
 
+from .pipeline import Pipeline, Stage
+
 
 class DetectProcess:  # pragma: no cover
     _loggers: list[BaseAnomalyLogger]
     _data_getter: ProcessGetter
     _collector: DBCollector
     _aggregator: Aggregator
+    _window_aggregator: WindowAggregator
     _detector: AnomalyDetector
     _verbose: bool
+    _collect_data: bool
+    _collect_stage: Stage
+    _detect_stage: Stage
+    _log_stage: Stage
+    _pipeline: Pipeline
     _run_cnt: int = 0
     min_normal_state_difference: Optional[int] = None
+    # Snapshots wait for the database instead of being lost, a detection is skipped while the previous one
+    # is still running, anomalies wait for the loggers.
+    collect_queue_size: int = 10
+    detect_queue_size: int = 1
+    log_queue_size: int = 100
 
     def __init__(
         self,
@@ -27,24 +41,49 @@ class DetectProcess:  # pragma: no cover
         verbose=False,
         detector_file=None,
         min_normal_state_difference=None,
+        collect=True,
+        train_file=None,
+        data_getter: Optional[ProcessGetter] = None,
+        collector_buffer_size=1,
     ) -> None:
-        self._data_getter = ProcessGetter()
-        self._collector = DBCollector(RawValue)
+        self._data_getter = data_getter or ProcessGetter()
         self._loggers = loggers_objs
         self._aggregator = Aggregator()
+        self._window_aggregator = WindowAggregator()
+        # Windows read from the database need every snapshot saved before detection.
+        self._collector = DBCollector(RawValue, collector_buffer_size if self._window_aggregator.supported else 1)
+        # Without the in-memory aggregation the windows are read back from the collected raw values.
+        self._collect_data = collect or not self._window_aggregator.supported
         self._detector = AnomalyDetector()
         self._verbose = verbose
         if min_normal_state_difference:
             self.min_normal_state_difference = int(min_normal_state_difference)
         if not detector_file:
             print("Fit detector")
-            self._detector.fit(self._aggregator.get_train_data())
+            train_aggregator = self._aggregator
+            if train_file:
+                train_aggregator = (
+                    FrameAggregator.from_parquet(train_file)
+                    if os.path.isdir(train_file)
+                    else FrameAggregator.from_csv(train_file)
+                )
+            self._detector.fit_stream(train_aggregator.iter_train_data)
             print("Detector fitted")
         else:
             print("Loading detector")
             self._detector.load_model(detector_file)
             print("Detector loaded")
 
+        self._log_stage = Stage("log", self._log_anomalies, self.log_queue_size)
+        self._detect_stage = Stage(
+            "detect", self._detect_stage_func, self.detect_queue_size, block=False, next_stage=self._log_stage
+        )
+        self._collect_stage = Stage(
+            "collect", self._collect_stage_func, self.collect_queue_size, next_stage=self._detect_stage
+        )
+        self._pipeline = Pipeline([self._collect_stage, self._detect_stage, self._log_stage])
+        self._pipeline.start()
+
     def _print_if_verbose(self, data: Any) -> None:
         if self._verbose:
             print(data)
@@ -60,33 +99,69 @@ class DetectProcess:  # pragma: no cover
         for logger in self._loggers:
             logger.log(data, dttm)
 
+    def _log_anomalies(self, item: tuple[list[dict], datetime]) -> None:
+        anomalies, dttm = item
+        self._print_if_verbose(f"Logging {len(anomalies)} anomalies...")
+        for anomaly in anomalies:
+            self._log(anomaly, dttm)
+
     def _get_data_for_detect(self, dttm: datetime) -> pd.DataFrame:
+        if self._window_aggregator.supported:
+            return self._window_aggregator.get_detect_data()
         return self._aggregator.get_detect_data(dttm)
 
     def _detect(self, detect_data: pd.DataFrame) -> list[pd.Series]:
         return self._detector.detect(detect_data, max_difference_to_skip=self.min_normal_state_difference)
 
+    def _collect_stage_func(self, item: tuple[datetime, pd.DataFrame, bool]) -> Optional[tuple[datetime, None]]:
+        dttm, data, detect = item
+        self._collect(data)
+        # The database windows include this snapshot only after it is saved, so detection follows the insert.
+        if detect and not self._window_aggregator.supported:
+            return dttm, None
+        return None
+
+    def _detect_stage_func(
+        self, item: tuple[datetime, Optional[pd.DataFrame]]
+    ) -> Optional[tuple[list[dict], datetime]]:
+        dttm, detect_data = item
+        self._print_if_verbose("Detecting")
+        try:
+            self._detect(detect_data if detect_data is not None else self._get_data_for_detect(dttm))
+        except AnomalyException as e:
+            return e.detail.details, dttm
+        finally:
+            self._print_if_verbose("Detection end")
+        return None
+
     def run(self) -> None:
         self._print_if_verbose("Getting data")
         dttm, data = self._get_data()
-        self._collect(data)
+        self._window_aggregator.push(dttm, data)
 
-        if self._run_cnt + 1 < self._aggregator.period_length:
+        detect = self._run_cnt + 1 >= self._aggregator.period_length
+        if not detect:
             self._run_cnt += 1
             self._print_if_verbose(
                 f"Collected {self._run_cnt} portions of {self._aggregator.period_length}. Skipping detecting..."
             )
-            return
-
-        self._print_if_verbose("Detecting")
-
-        try:
-            self._detect(
-                self._get_data_for_detect(dttm),
-            )
-        except AnomalyException as e:
-            self._print_if_verbose(f"Logging {e.detail.count} anomalies...")
-            for anomaly in e.detail.details:
-                self._log(anomaly, dttm)
 
-        self._print_if_verbose("Detection end")
+        # Blocks while the collect queue is full, so a slow database slows the snapshots down instead of
+        # growing memory.
+        if self._collect_data:
+            self._collect_stage.put((dttm, data, detect))
+        if detect and self._window_aggregator.supported:
+            # The window is taken here, the next push may change it before the detect stage reads it.
+            if not self._detect_stage.put((dttm, self._get_data_for_detect(dttm))):
+                self._print_if_verbose(f"Detection for {dttm} skipped, the previous one is still running")
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        # Queued snapshots are saved and queued anomalies are logged before the stages exit. A collect stage still
+        # running after the timeout keeps using the collector, so its buffer is not flushed from here.
+        self._pipeline.stop(timeout)
+        if self._collect_stage.is_alive():
+            print("Collect stage did not stop in time, buffered snapshots are not saved.")
+        else:
+            self._collector.flush()
+        for stage in self._pipeline:
+            self._print_if_verbose(str(stage))
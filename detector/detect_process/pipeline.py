@@ -0,0 +1,109 @@
+import threading
+import time
+import traceback
+from queue import Empty, Full, Queue
+from typing import Any, Callable, Optional
+
+_STOP = object()
+
+
+class Stage(threading.Thread):
+    # A worker thread with a bounded input queue. When the queue is full, put either waits for the worker
+    # (block=True) or drops the item and counts it (block=False), so a slow stage never grows memory.
+    _func: Callable[[Any], Any]
+    _queue: Queue
+    _block: bool
+    _next_stage: Optional["Stage"]
+    dropped: int = 0
+    failed: int = 0
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[Any], Any],
+        maxsize: int = 1,
+        block=True,
+        next_stage: Optional["Stage"] = None,
+    ) -> None:
+        super().__init__(name=name, daemon=True)
+        self._func = func
+        self._queue = Queue(maxsize=maxsize)
+        self._block = block
+        self._next_stage = next_stage
+
+    def put(self, item: Any) -> bool:
+        try:
+            self._queue.put(item, block=self._block)
+        except Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                result = self._func(item)
+                if self._next_stage is not None and result is not None:
+                    self._next_stage.put(result)
+            except Exception:
+                self.failed += 1
+                traceback.print_exc()
+            finally:
+                self._queue.task_done()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        # Items put before stop are processed first. The stop marker waits for a free slot within the same
+        # timeout as the join, a stage which does not drain in time drops its queued items instead.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except Full:
+            # A previous stage which did not stop in time may still put items, so the marker is retried.
+            while True:
+                self._drop_queued()
+                try:
+                    self._queue.put_nowait(_STOP)
+                    break
+                except Full:
+                    continue
+        self.join(None if deadline is None else max(deadline - time.monotonic(), 0))
+
+    def _drop_queued(self) -> None:
+        while True:
+            try:
+                self._queue.get_nowait()
+            except Empty:
+                return
+            self.dropped += 1
+            self._queue.task_done()
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+    def __str__(self) -> str:
+        return f"Stage {self.name}: {len(self)} queued, {self.dropped} dropped, {self.failed} failed"
+
+
+class Pipeline:
+    # Stages are given from the first one to the last one and are stopped in that order, so every item
+    # already queued is passed down and handled before shutdown.
+    _stages: list[Stage]
+
+    def __init__(self, stages: list[Stage]) -> None:
+        self._stages = stages
+
+    def start(self) -> None:
+        for stage in self._stages:
+            stage.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        # The timeout is shared by all stages.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for stage in self._stages:
+            stage.stop(None if deadline is None else max(deadline - time.monotonic(), 0))
+
+    def __iter__(self):
+        return iter(self._stages)
@@ -5,12 +5,21 @@ from dotenv import load_dotenv
 COLLECTORS = {
     "db": {
         "class": "DBCollector",
-        "args": ["raw_values_cls"],
+        "args": ["raw_values_cls", "collector_buffer_size"],
     },
     "csv": {
         "class": "CsvCollector",
         "args": ["collector_filename"],
     },
+    "parquet": {
+        "class": "ParquetCollector",
+        "args": [
+            "collector_filename",
+            "collector_buffer_size",
+            "collector_rotate_minutes",
+            "collector_rotate_mb",
+        ],
+    },
 }
 LOGGERS = {
     "console": {
@@ -25,6 +34,17 @@ LOGGERS = {
     },
 }
 
+DATA_GETTERS = {
+    "psutil": {
+        "class": "ProcessGetter",
+        "args": ["expensive_attrs_interval"],
+    },
+    "procfs": {
+        "class": "ProcFSGetter",
+        "args": ["expensive_attrs_interval"],
+    },
+}
+
 INSTANCE_TYPES = {
     "collector": {
         "module": "detector.collectors",
@@ -34,6 +54,10 @@ INSTANCE_TYPES = {
         "module": "detector.loggers",
         "classes": LOGGERS,
     },
+    "data_getter": {
+        "module": "detector.data_getter",
+        "classes": DATA_GETTERS,
+    },
 }
 
 load_dotenv()
@@ -48,6 +72,13 @@ DETECTOR_LOGGER_FILENAME = getenv("DETECTOR_LOGGER_FILENAME")
 DETECTOR_LOGGER = getenv("DETECTOR_LOGGER", "db")
 DETECTOR_VERBOSE = getenv("DETECTOR_VERBOSE", False)
 DETECTOR_FILE = getenv("DETECTOR_FILE")
+DETECTOR_STOP_TIMEOUT = float(getenv("DETECTOR_STOP_TIMEOUT", 30))
+DATA_GETTER = getenv("DATA_GETTER", "psutil")
+EXPENSIVE_ATTRS_INTERVAL = int(getenv("EXPENSIVE_ATTRS_INTERVAL", 1))
+COLLECTOR_BUFFER_SIZE = int(getenv("COLLECTOR_BUFFER_SIZE", 1))
+COLLECTOR_ROTATE_MINUTES = int(getenv("COLLECTOR_ROTATE_MINUTES", 60))
+COLLECTOR_ROTATE_MB = int(getenv("COLLECTOR_ROTATE_MB", 64))
+RETENTION_DAYS = int(getenv("RETENTION_DAYS", 7))
 API_TOKEN = getenv("API_TOKEN")
 EXCLUDE_EXE = getenv("EXCLUDE_EXE", "")
 EXCLUDE_COMMAND = getenv("EXCLUDE_COMMAND", "")
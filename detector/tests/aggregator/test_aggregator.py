@@ -1,10 +1,12 @@
 from datetime import datetime
 
+import numpy as np
+import pandas as pd
 from sqlalchemy import and_, case, func
 
 from detector.aggregator import Aggregator
 from detector.aggregator.aggregation_settings import AggregationSetting, CustomAggregation, SimpleAggregation
-from detector.db import extract_time
+from detector.db import AggregatedWindow, RawCleanedValue, RawValue, extract_time
 
 
 def test_aggregator(db_session, raw_value_cleaned_factory, raw_value_factory):
@@ -77,5 +79,77 @@ def test_aggregator(db_session, raw_value_cleaned_factory, raw_value_factory):
         [0.3, 0.4, 0],
     ]
 
+    assert pd.concat(aggregator.iter_train_data(chunk_size=2), ignore_index=True).equals(data)
+
     data = aggregator.get_detect_data(datetime(2022, 4, 15, 10, 1))
     assert data.values.round(1).tolist() == [[0.6, 0.8, 1]]
+
+
+def test_aggregator_materialized_windows(db_session, raw_value_cleaned_factory, mocker):
+    for minutes in range(5):
+        raw_value_cleaned_factory(dttm=datetime(2022, 4, 15, 10, minutes), pid=1, cpu_percent=minutes, connections=0)
+
+    aggregator = Aggregator()
+    aggregator.period_length = 2
+
+    assert aggregator.refresh_windows(RawCleanedValue) == 3
+    assert aggregator.refresh_windows(RawCleanedValue) == 0
+    assert db_session.query(AggregatedWindow).count() == 3
+
+    raw_value_cleaned_factory(dttm=datetime(2022, 4, 15, 10, 5), pid=1, cpu_percent=5, connections=0)
+
+    data = aggregator.get_train_data()
+    assert db_session.query(AggregatedWindow).count() == 4
+    assert data.cpu_percent_avg.tolist() == [1.5, 2.5, 3.5, 4.5]
+    assert data.connections_avg.isna().all()
+
+    windows = aggregator.load_windows(RawCleanedValue, dttm_from=datetime(2022, 4, 15, 10, 3))
+    assert windows.index.tolist() == [
+        datetime(2022, 4, 15, 10, 3),
+        datetime(2022, 4, 15, 10, 4),
+        datetime(2022, 4, 15, 10, 5),
+    ]
+    assert windows.equals(aggregator.get_windows(windows.index.tolist(), RawCleanedValue).astype(windows.dtypes))
+
+    # A backfilled raw value is newer than the stored windows, all of them are recomputed.
+    raw_value_cleaned_factory(dttm=datetime(2022, 4, 15, 10, 2), pid=2, cpu_percent=8, connections=0)
+    assert aggregator.refresh_windows(RawCleanedValue) == 4
+    data = aggregator.get_train_data()
+    assert db_session.query(AggregatedWindow).count() == 4
+    expected = aggregator.get_windows(aggregator.get_dttms(RawCleanedValue), RawCleanedValue)
+    assert data.cpu_percent_avg.tolist() == expected.cpu_percent_avg.tolist() != [1.5, 2.5, 3.5, 4.5]
+
+    get_windows_query = mocker.spy(aggregator, "_get_windows_query")
+    settings_hash = aggregator.settings_hash(RawCleanedValue)
+    assert settings_hash == aggregator.settings_hash(RawCleanedValue)
+    assert get_windows_query.call_count == 0
+    assert settings_hash != aggregator.settings_hash(RawValue)
+    aggregator.period_length = 3
+    assert settings_hash != aggregator.settings_hash(RawCleanedValue)
+    assert aggregator.refresh_windows(RawCleanedValue) == 3
+
+
+def test_aggregator_reads_raw_values_once(db_session, raw_value_cleaned_factory, mocker):
+    for minutes in range(12):
+        for pid in [1, 2, 3]:
+            raw_value_cleaned_factory(dttm=datetime(2022, 4, 15, 10, minutes), pid=pid, username=f"user{pid % 2}")
+
+    aggregator = Aggregator()
+    aggregator.period_length = 3
+    aggregator.windows_batch_size = 2
+    read_raw_values = mocker.spy(aggregator, "_read_raw_values")
+
+    assert aggregator.refresh_windows(RawCleanedValue) == 9
+    # Batches of windows only read the raw values newer than the previous batch, each value once per refresh.
+    assert read_raw_values.call_count == 5
+    read = pd.concat(read_raw_values.spy_return_list)
+    assert len(read) == len(read[["dttm", "pid"]].drop_duplicates())
+    assert read.dttm.min() == datetime(2022, 4, 15, 10, 1)
+    assert len(read) == db_session.query(RawCleanedValue).filter(RawCleanedValue.dttm >= read.dttm.min()).count()
+
+    windows = aggregator.load_windows(RawCleanedValue)
+    expected = pd.DataFrame(
+        aggregator._get_windows_query(windows.index.tolist(), db_session, RawCleanedValue).all(),
+        columns=["dttm"] + windows.columns.tolist(),
+    ).set_index("dttm")
+    assert np.allclose(windows.astype(float).values, expected.astype(float).values, equal_nan=True)
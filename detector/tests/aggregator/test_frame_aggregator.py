@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from detector.aggregator import Aggregator, FrameAggregator
+from detector.aggregator.aggregation_settings import AggregationSetting, CustomAggregation, SimpleAggregation
+from detector.collectors import CsvCollector, DBCollector
+from detector.db import RawCleanedValue
+
+
+def test_frame_aggregator(db_session, process_info_factory, tmp_path):
+    filename = str(tmp_path / "collected_data.csv")
+    csv_collector = CsvCollector(filename)
+    db_collector = DBCollector(RawCleanedValue)
+
+    dttm = datetime(2022, 4, 15, 5, 40)
+    for minutes in [0, 1, 2, 4, 5, 7, 8, 9, 10, 11, 13, 30, 31, 32, 33, 34, 35, 36, 37, 38, 39, 40]:
+        snapshot_dttm = (dttm + timedelta(minutes=minutes)).timestamp()
+        data = pd.DataFrame(
+            [
+                process_info_factory(dttm=snapshot_dttm, pid=pid, create_time=snapshot_dttm, username=username)
+                for pid, username in [(1, "root"), (2, "root"), (3, "sys"), (minutes % 5 + 4, "user")]
+            ]
+        )
+        csv_collector.collect(data)
+        db_collector.collect(data)
+
+    aggregator = Aggregator()
+    frame_aggregator = FrameAggregator.from_csv(filename)
+
+    expected = aggregator.get_train_data()
+    result = frame_aggregator.get_train_data()
+
+    assert list(result.columns) == list(expected.columns)
+    assert np.allclose(result.astype(float).values, expected.astype(float).values, equal_nan=True)
+    assert sorted(result.time_of_day.unique()) == [0, 1]
+
+    dttms = frame_aggregator.get_dttms(dttm_from=datetime(2022, 4, 15, 5, 52), dttm_to=datetime(2022, 4, 15, 6, 16))
+    assert dttms == aggregator.get_dttms(RawCleanedValue, datetime(2022, 4, 15, 5, 52), datetime(2022, 4, 15, 6, 16))
+    assert np.allclose(
+        frame_aggregator.get_windows(dttms).astype(float).values,
+        aggregator.get_windows(dttms, RawCleanedValue).astype(float).values,
+        equal_nan=True,
+    )
+    # Windows are differences of cumulative sums, so chunks only match up to the float rounding.
+    chunks = pd.concat(frame_aggregator.iter_train_data(chunk_size=3), ignore_index=True)
+    assert chunks.dtypes.equals(result.dtypes)
+    assert np.allclose(chunks.astype(float).values, result.astype(float).values, equal_nan=True)
+
+
+def test_frame_aggregator_custom_aggregation(process_info_factory):
+    dttm = datetime(2022, 4, 15, 10)
+    data = pd.DataFrame(
+        [
+            process_info_factory(
+                dttm=dttm + timedelta(minutes=minutes), pid=pid, username="user", cpu_percent=minutes + pid
+            )
+            for minutes in range(4)
+            for pid in [1, 2]
+        ]
+    )
+    frame_aggregator = FrameAggregator(data)
+    frame_aggregator.period_length = 2
+    frame_aggregator.aggregation_settings = AggregationSetting(
+        simple_agg=[SimpleAggregation("max", ["cpu_percent"])],
+        custom_agg=[CustomAggregation("processes_count", lambda x: x, lambda x: len(x))],
+        qualitatives=[],
+    )
+
+    assert frame_aggregator.aggregation_settings.supports_frame
+    assert frame_aggregator.get_train_data().values.tolist() == [[3.5, 2], [4.5, 2]]
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from detector.aggregator import Aggregator, WindowAggregator
+from detector.aggregator.aggregation_settings import AggregationSetting, CustomAggregation, SimpleAggregation
+from detector.collectors import DBCollector
+from detector.db import RawValue
+
+
+def test_window_aggregator(db_session, process_info_factory):
+    aggregator = Aggregator()
+    window_aggregator = WindowAggregator()
+    collector = DBCollector(RawValue)
+
+    assert window_aggregator.supported
+
+    dttm = datetime(2022, 4, 15, 11, 50)
+    for minutes in [0, 1, 2, 4, 5, 7, 8, 9, 10, 11, 13, 30, 31]:
+        snapshot_dttm = dttm + timedelta(minutes=minutes)
+        data = pd.DataFrame(
+            [
+                process_info_factory(dttm=snapshot_dttm.timestamp(), pid=pid, create_time=snapshot_dttm.timestamp())
+                for pid in range(minutes % 4, 6)
+            ]
+            + [
+                process_info_factory(
+                    dttm=snapshot_dttm.timestamp(),
+                    pid=10,
+                    username="root",
+                    connections=0,
+                    create_time=snapshot_dttm.timestamp(),
+                )
+            ]
+        )
+        snapshot_dttm = pd.to_datetime(snapshot_dttm.timestamp(), unit="s")
+        window_aggregator.push(snapshot_dttm, data)
+        collector.collect(data)
+
+        expected = aggregator.get_detect_data(snapshot_dttm)
+        result = window_aggregator.get_detect_data()
+
+        assert list(result.columns) == list(expected.columns)
+        assert np.allclose(result.astype(float).values, expected.astype(float).values, equal_nan=True)
+
+    assert len(window_aggregator) == 2
+
+
+def test_window_aggregator_supported():
+    window_aggregator = WindowAggregator()
+    window_aggregator.aggregation_settings = AggregationSetting(
+        simple_agg=[SimpleAggregation("sum", ["cpu_percent"])],
+        custom_agg=[CustomAggregation("root_processes_count", lambda x: x)],
+        qualitatives=[],
+    )
+
+    assert not window_aggregator.supported
@@ -1,12 +1,17 @@
 import os
+import random
+import struct
+import weakref
 from decimal import Decimal
 
+import numpy as np
 import pandas as pd
 import pytest
 
-from detector.algorythm import AnomalyDetector, AnomalyException
-from detector.algorythm.splits import SplitsCollection
-from detector.algorythm.states import State, StatesCollection
+from detector.algorythm import AnomalyDetector, AnomalyException, binary_model
+from detector.algorythm.bk_tree import BKTree, hamming_distance
+from detector.algorythm.splits import QualitativeSplit, QuantitativeSplit, SplitsCollection
+from detector.algorythm.states import QualitativeValue, State, StatesCollection, StatesMoments
 
 
 def test_algorythm():
@@ -118,6 +123,41 @@ def test_algorythm():
 
     os.remove("./detector/tests/algorythm/__test_save.json")
 
+    detector.save_model("./detector/tests/algorythm/__test_save.bin", binary=True)
+
+    detector_new = AnomalyDetector()
+    detector_new.load_model("./detector/tests/algorythm/__test_save.bin")
+
+    assert detector._splits == detector_new._splits
+    assert detector_new._normal_states.contains(df).tolist() == detector._normal_states.contains(df).tolist()
+    assert detector_new.detect(df, raise_exception=False) == detector.detect(df, raise_exception=False)
+    assert detector_new._normal_states == detector._normal_states
+    assert {state: state.as_dict for state in detector_new._normal_states} == {
+        state: state.as_dict for state in detector._normal_states
+    }
+
+    with open("./detector/tests/algorythm/__test_save.bin", "r+b") as file:
+        file.seek(len(binary_model.MAGIC))
+        file.write(struct.pack("<I", binary_model.VERSION + 1))
+    pytest.raises(ValueError, detector_new.load_model, "./detector/tests/algorythm/__test_save.bin").match(
+        "Unsupported binary model version"
+    )
+
+    os.remove("./detector/tests/algorythm/__test_save.bin")
+
+
+def test_parallel_fit():
+    df = pd.read_csv("./detector/tests/algorythm/test_data.csv")
+
+    serial, parallel = AnomalyDetector(), AnomalyDetector()
+    serial.fit(df)
+    parallel.fit(df, workers=2)
+
+    assert parallel._splits == serial._splits
+    assert parallel._normal_states == serial._normal_states
+    assert parallel._columns == serial._columns
+    assert SplitsCollection.build(df, workers=2) == SplitsCollection.build(df)
+
 
 def test_splits_collection():
     data = pd.DataFrame(
@@ -185,6 +225,23 @@ def test_splits_collection():
     assert SplitsCollection._get_interval(data.loc[:1, "int"]) == (1, 8)
 
 
+def test_find_minimums(mocker):
+    assert SplitsCollection._find_mininmums(pd.Series([3, 3, 3])) == []
+    assert SplitsCollection._find_mininmums(pd.Series([3.0, None])) == []
+
+    rng = np.random.default_rng(1)
+    data = pd.Series(np.concatenate([rng.normal(10, 1, 5000), rng.normal(30, 1, 5000)]))
+
+    minimums = SplitsCollection._find_mininmums(data)
+    assert len(minimums) == 1
+    assert 15 < minimums[0] < 25
+
+    mocker.patch.object(SplitsCollection, "kde_max_samples", 1000)
+    subsampled_minimums = SplitsCollection._find_mininmums(data)
+    assert len(subsampled_minimums) == 1
+    assert 15 < subsampled_minimums[0] < 25
+
+
 def test_states_collection():
     df = pd.read_csv("./detector/tests/algorythm/test_data.csv")
     detector = AnomalyDetector()
@@ -229,6 +286,10 @@ def test_states_collection():
     }
 
     assert State((0.0, 1.0, 0.0, 0.0, 1.0)) ^ anomaly_vector == 2
+    assert State((0.0, 1.0, 0.0, 0.0, 1.0)).as_int == 0b01001
+    assert detector._splits.field_masks == [0b11000, 0b00111]
+    assert detector._splits.value_from_int(1, 0b01001) == detector._splits[1].splits[2]
+    assert detector._splits.value_from_int(1, 0b01000) is None
 
     assert len(detector._normal_states) == 3
     assert detector._normal_states[0] == State((0.0, 1.0, 0.0, 0.0, 1.0))
@@ -249,3 +310,197 @@ def test_states_collection():
 
     assert str(detector._normal_states[0]) == "01001"
     assert str(detector._normal_states) == "{01001, 01100, 10010}"
+
+
+def test_encode_batch():
+    df = pd.read_csv("./detector/tests/algorythm/test_data.csv")
+    df["qualitative"] = [i % 3 for i in range(len(df))]
+    detector = AnomalyDetector(qualitatives=["qualitative"])
+    detector.fit(df)
+
+    data = pd.concat(
+        [
+            df,
+            pd.DataFrame(
+                columns=["x1", "x2", "qualitative"],
+                data=[(-100, 1000, 1), (1000, -100, -1), (7.4, 9.744, 5), (float("nan"), 9.744, 1)],
+            ),
+        ],
+        ignore_index=True,
+    )
+
+    encoded, has_out_of_range = detector._encode_batch(data)
+
+    assert [tuple(state) for state in encoded] == [detector._encode(row) for _, row in data.iterrows()]
+    assert has_out_of_range.tolist() == [
+        detector._encode(row, return_out_of_range=True)[1] for _, row in data.iterrows()
+    ]
+    assert has_out_of_range[-4:].all()
+
+
+def test_bk_tree():
+    rng = random.Random(42)
+    splits = SplitsCollection(
+        [
+            QuantitativeSplit(f"x{i}", [(float(j), float(j + 1)) for j in range(size)])
+            for i, size in enumerate([3, 4, 2, 5])
+        ]
+        + [QualitativeSplit("q1", ["a", "b", "c"]), QualitativeSplit("q2", [0, 1, 2, 3])]
+    )
+
+    # Stored states have exactly one set bit per field, like the encoded data.
+    def random_positions():
+        return tuple(rng.randrange(len(split.splits)) for split in splits)
+
+    def random_state():
+        return tuple(map(float, splits.state_from_positions(random_positions())))
+
+    states = StatesCollection({random_state() for _ in range(300)}, splits=splits)
+    tree = BKTree(state.as_int for state in states)
+
+    assert len(tree) == len(states)
+    assert BKTree().search(0, 3) == []
+
+    for _ in range(20):
+        query = State(random_state())
+        for radius in range(0, 4):
+            expected = sorted(
+                (state.as_int, hamming_distance(state.as_int, query.as_int))
+                for state in states
+                if hamming_distance(state.as_int, query.as_int) <= radius
+            )
+            assert sorted(
+                (tree._nodes[node_id][0], distance) for node_id, distance in tree.search(query.as_int, radius)
+            ) == (expected)
+
+            # The distance of one-hot states is the number of fields with a different position.
+            query_positions = splits.positions_from_state(query.state)
+            differ = {
+                state: sum(a != b for a, b in zip(splits.positions_from_state(state.state), query_positions))
+                for state in states
+            }
+            assert all(hamming_distance(state.as_int, query.as_int) == 2 * differ[state] for state in states)
+            assert states.closest_states(query, max_distance=radius) == {
+                state for state in states if differ[state] <= radius
+            }
+            assert states.closest_states(query, max_distance=radius) == {
+                state for state in states if state ^ query <= radius
+            }
+            assert states.closest_states(query, max_distance=radius, ignore_zero_difference=True) == {
+                state for state in states if 0 < state ^ query <= radius
+            }
+
+
+def test_states_collection_contains():
+    df = pd.read_csv("./detector/tests/algorythm/test_data.csv")
+    df["qualitative"] = [i % 2 for i in range(len(df))]
+    detector = AnomalyDetector(qualitatives=["qualitative"])
+    detector.fit(df)
+
+    data = pd.concat([df, df * 1.1, df * 0.9, df + 0.5], ignore_index=True).astype(float)
+    data.loc[0, "x1"] = float("nan")
+    states = detector._normal_states
+    states._rows_chunk_size = 16
+    states._states_block_size = 1
+
+    expected = [any(row in state for state in states) for _, row in data.iterrows()]
+
+    assert states.contains(data).tolist() == expected
+    assert [row in states for _, row in data.iterrows()] == expected
+    assert any(expected) and not all(expected)
+    assert StatesCollection(set()).contains(data).tolist() == [False] * len(data)
+
+
+def test_states_collection_build():
+    df = pd.read_csv("./detector/tests/algorythm/test_data.csv")
+    df["qualitative"] = [i % 2 for i in range(len(df))]
+    detector = AnomalyDetector(qualitatives=["qualitative"])
+    detector.fit(df, clear_anomalies=False)
+    df = detector._clean_df(df)
+
+    for state in detector._normal_states:
+        intervals = detector._splits.splits_from_state(state.state)
+        filt = df.qualitative == intervals["qualitative"]
+        for field in ["x1", "x2"]:
+            filt &= (df[field] >= intervals[field][0]) & (df[field] < intervals[field][1])
+        values = df[filt]
+
+        assert state.qualitative_values == [QualitativeValue("qualitative", intervals["qualitative"])]
+        for param in state.ellipsoid_params:
+            if len(values) <= 2:
+                mi, ma = intervals[param.field]
+                assert (param.mean, param.std) == ((ma + mi) / 2, (ma - mi) / 2)
+            else:
+                assert param.mean == pytest.approx(values[param.field].mean())
+                assert param.std == pytest.approx(3 * values[param.field].std())
+
+
+@pytest.mark.parametrize("binary", [False, True])
+def test_partial_fit(tmp_path, binary):
+    df = pd.read_csv("./detector/tests/algorythm/test_data.csv")
+    half = len(df) // 2
+
+    detector = AnomalyDetector()
+    pytest.raises(ValueError, detector.partial_fit, df).match('You should call "fit" or load a model saved')
+
+    detector.fit(df)
+    expected_moments, expected_states = detector._moments, detector._normal_states
+    detector._moments = StatesMoments.from_data(detector._clean_df(df.iloc[:half]), detector._splits)
+
+    path = str(tmp_path / "model")
+    detector.save_model(path, binary=binary)
+    detector = AnomalyDetector()
+    detector.load_model(path)
+    detector.partial_fit(df.iloc[half:])
+
+    moments = detector._moments
+    order = [moments.positions.tolist().index(key) for key in expected_moments.positions.tolist()]
+    assert sorted(order) == list(range(len(expected_moments)))
+    assert moments.counts[order].tolist() == expected_moments.counts.tolist()
+    assert moments.sizes[order].tolist() == expected_moments.sizes.tolist()
+    assert moments.means[order] == pytest.approx(expected_moments.means)
+    assert moments.m2[order] == pytest.approx(expected_moments.m2)
+    assert detector._normal_states == expected_states
+
+
+def test_fit_stream():
+    df = pd.read_csv("./detector/tests/algorythm/test_data.csv")
+    calls, cleaned, alive = [], [], []
+
+    def chunks():
+        calls.append(1)
+        for i in range(0, len(df), 7):
+            # At most the previous chunk and the first one kept as the sample are still referenced.
+            alive.append(sum(ref() is not None for ref in cleaned))
+            yield df.iloc[i : i + 7]  # noqa: E203
+
+    expected = AnomalyDetector()
+    expected.fit(df)
+
+    detector = AnomalyDetector()
+    pytest.raises(ValueError, detector.fit_stream, lambda: iter([])).match("There is no data to fit.")
+
+    def clean_df(data):
+        data = AnomalyDetector._clean_df(detector, data)
+        cleaned.append(weakref.ref(data))
+        return data
+
+    detector._clean_df = clean_df
+    detector.fit_stream(chunks)
+    del detector._clean_df
+
+    # The source is streamed twice and the cleaned chunks are not kept, whatever the length of the history.
+    assert len(calls) == 2
+    assert len(cleaned) == 2 * len(range(0, len(df), 7)) > 10
+    assert max(alive) <= 2
+    assert all(ref() is None for ref in cleaned)
+
+    assert detector._splits.to_dict() == expected._splits.to_dict()
+    assert detector._normal_states == expected._normal_states
+
+    detector.fit_stream(chunks, sample_size=20)
+    df = detector._clean_df(df)
+    _, out_of_range = detector._splits.positions(df)
+
+    assert not out_of_range.any()
+    assert detector._moments.counts.sum() == len(df)
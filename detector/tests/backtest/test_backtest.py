@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from detector.algorythm import AnomalyDetector
+from detector.backtest import Backtest
+from detector.backtest.backtest import RESULT_COLUMNS, label_windows
+from detector.db import RawCleanedValue
+
+
+def test_backtest(db_session, raw_value_cleaned_factory):
+    df = pd.read_csv("./detector/tests/algorythm/test_data.csv").rename(
+        {"x1": "cpu_percent_sum", "x2": "memory_percent_sum"}, axis=1
+    )
+    detector = AnomalyDetector()
+    detector.fit(df)
+
+    start = datetime(2022, 4, 15, 10)
+    for minute in range(15):
+        for pid in (1, 2):
+            cpu_percent = 400 if minute == 14 and pid == 1 else df.iloc[19].cpu_percent_sum / 2
+            raw_value_cleaned_factory(
+                dttm=start + timedelta(minutes=minute),
+                pid=pid,
+                username="user",
+                cpu_percent=cpu_percent,
+                memory_percent=df.iloc[19].memory_percent_sum / 2,
+            )
+
+    backtest = Backtest(detector, raw_value_cls=RawCleanedValue, workers=1)
+    assert str(backtest) == "Backtest, workers: 1"
+
+    result = backtest.run()
+
+    assert list(result.columns) == RESULT_COLUMNS
+    assert result.dttm.tolist() == [start + timedelta(minutes=minute) for minute in range(10, 15)]
+    assert result.anomaly.tolist() == [False, False, False, False, True]
+    assert result.out_of_range.tolist() == [False, False, False, False, True]
+    assert set(result.label) <= {1, 2, 3, "anomaly"}
+
+    result = backtest.run(start + timedelta(minutes=12), start + timedelta(minutes=13))
+    assert result.dttm.tolist() == [start + timedelta(minutes=12), start + timedelta(minutes=13)]
+
+    assert backtest.run(start + timedelta(minutes=20)).empty
+    assert label_windows(detector, pd.DataFrame()).empty
@@ -1,3 +1,5 @@
+import pandas as pd
+
 from detector.collectors import DBCollector
 from detector.db import RawCleanedValue, RawValue
 
@@ -18,3 +20,29 @@ def test_db_collector(db_session, processes_data):
     assert db_session.query(RawCleanedValue).count() == 10
 
     assert str(collector) == "DBCollector"
+
+
+def test_db_collector_buffer(db_session, processes_data):
+    dttm, data = processes_data
+
+    collector = DBCollector(RawValue, 3)
+    collector.collect(data)
+    collector.collect(data)
+
+    assert db_session.query(RawValue).count() == 0
+
+    collector.collect(data)
+
+    assert db_session.query(RawValue).count() == 30
+
+    collector.collect(data)
+    collector.flush()
+
+    assert db_session.query(RawValue).count() == 40
+
+    row = data.iloc[0]
+    value = db_session.query(RawValue).filter(RawValue.pid == int(row.pid)).first()
+    assert value.dttm == pd.to_datetime(row.dttm, unit="s").floor("us")
+    assert value.create_time == pd.to_datetime(row.create_time, unit="s").floor("us")
+    assert value.name == row["name"]
+    assert value.cpu_percent == row.cpu_percent
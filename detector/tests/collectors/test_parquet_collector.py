@@ -0,0 +1,117 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from detector.aggregator import FrameAggregator
+from detector.collectors import ParquetCollector
+from detector.collectors.parquet_collector import INDEX_FILENAME, get_segments, read_index, read_segments
+from detector.data_getter.process_getter import COLUMNS
+
+pytest.importorskip("pyarrow")
+
+
+def get_snapshot(process_info_factory, dttm: datetime) -> pd.DataFrame:
+    return pd.DataFrame(
+        [
+            process_info_factory(
+                dttm=dttm.timestamp(),
+                create_time=dttm.timestamp() - pid,
+                pid=pid,
+                username=f"user{pid % 2}",
+                terminal=0 if pid % 3 else "/dev/pts/0",
+            )
+            for pid in range(1, 6)
+        ],
+        columns=COLUMNS,
+    )
+
+
+def test_parquet_collector(process_info_factory, tmp_path):
+    directory = str(tmp_path / "segments")
+    collector = ParquetCollector(directory, 2, 10)
+    dttm = datetime(2022, 4, 15, 11, 50)
+    snapshots = [get_snapshot(process_info_factory, dttm + timedelta(minutes=i)) for i in range(25)]
+
+    assert str(collector) == f"ParquetCollector, directory: {directory}"
+
+    for snapshot in snapshots:
+        collector.collect(snapshot)
+
+    # Segments are rotated every 10 minutes of snapshots, the open one is not in the index yet.
+    assert [segment["rows"] for segment in read_index(directory)] == [60, 60]
+    assert len(list(read_segments(directory))) == 2
+    collector.flush()
+    index = read_index(directory)
+
+    assert [segment["rows"] for segment in index] == [60, 60, 5]
+    assert index[0]["dttm_from"] == dttm.isoformat()
+    assert index[-1]["dttm_to"] == (dttm + timedelta(minutes=24)).isoformat()
+
+    data = pd.concat(read_segments(directory), ignore_index=True)
+    expected = pd.concat(snapshots, ignore_index=True)
+
+    assert list(data.columns) == COLUMNS
+    assert (data.dttm == pd.to_datetime(expected.dttm, unit="s").dt.floor("us")).all()
+    assert (data.pid == expected.pid).all()
+    assert (data.cpu_percent == expected.cpu_percent).all()
+    assert data.terminal.isna().sum() == (expected.terminal == 0).sum()
+
+    # Only the segments of the range are read.
+    dttm_from, dttm_to = dttm + timedelta(minutes=3), dttm + timedelta(minutes=7)
+    chunks = list(read_segments(directory, ["dttm", "pid"], dttm_from, dttm_to, batch_size=5))
+
+    assert all(list(chunk.columns) == ["dttm", "pid"] for chunk in chunks)
+    assert pd.concat(chunks).dttm.drop_duplicates().tolist() == [dttm + timedelta(minutes=i) for i in range(3, 8)]
+
+
+def test_parquet_collector_recovery(process_info_factory, tmp_path):
+    directory = str(tmp_path / "segments")
+    collector = ParquetCollector(directory, 1, 5)
+    dttm = datetime(2022, 4, 15, 11, 50)
+    for i in range(8):
+        collector.collect(get_snapshot(process_info_factory, dttm + timedelta(minutes=i)))
+
+    # The open segment is written under a temporary name and is not read.
+    assert sorted(os.listdir(directory)) == [
+        f"{dttm:%Y%m%dT%H%M%S%f}.parquet",
+        f"{dttm + timedelta(minutes=6):%Y%m%dT%H%M%S%f}.parquet.tmp",
+        INDEX_FILENAME,
+    ]
+    assert sum(len(data) for data in read_segments(directory)) == 30
+
+    collector.flush()
+    index = read_index(directory)
+
+    # The collector stopped after the last segment was renamed, before it was added to the index.
+    with open(os.path.join(directory, INDEX_FILENAME), "w") as file:
+        json.dump(index[:-1], file)
+
+    assert get_segments(directory) == index
+    assert sum(len(data) for data in read_segments(directory)) == 40
+
+    collector = ParquetCollector(directory, 1, 5)
+    collector.collect(get_snapshot(process_info_factory, dttm + timedelta(minutes=8)))
+    collector.flush()
+
+    assert read_index(directory) == [*index, get_segments(directory)[-1]]
+    assert [segment["rows"] for segment in read_index(directory)] == [30, 10, 5]
+
+
+def test_frame_aggregator_from_parquet(process_info_factory, tmp_path):
+    directory = str(tmp_path / "segments")
+    collector = ParquetCollector(directory, 1, 5)
+    dttm = datetime(2022, 4, 15, 11, 50)
+    snapshots = [get_snapshot(process_info_factory, dttm + timedelta(minutes=i)) for i in range(15)]
+    for snapshot in snapshots:
+        collector.collect(snapshot)
+    collector.flush()
+
+    data = pd.concat(snapshots, ignore_index=True)
+    data.dttm = pd.to_datetime(data.dttm, unit="s")
+    expected = FrameAggregator(data).get_train_data()
+    result = FrameAggregator.from_parquet(directory).get_train_data()
+
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
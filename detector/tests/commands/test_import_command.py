@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from detector.aggregator import Aggregator
+from detector.commands.import_command import ImportCommand, read_csv_chunks, read_parquet_chunks
+from detector.data_getter.process_getter import COLUMNS
+from detector.db import AggregatedWindow, RawCleanedValue
+
+
+def test_import_command(db_session, process_info_factory, mocker, tmp_path):
+    filename = tmp_path / "data.csv"
+    data = pd.DataFrame(
+        [process_info_factory(dttm=1650023400.5 + i // 10 * 60, create_time=1650000000.25 + i) for i in range(25)],
+        columns=COLUMNS,
+    )
+    filename.write_text(data.to_csv(header=False, index=False))
+
+    chunks = list(read_csv_chunks(str(filename), 10))
+    assert [len(chunk) for chunk, _ in chunks] == [10, 10, 5]
+    assert chunks[-1][1] == 1
+
+    stdscr = mocker.MagicMock()
+    stdscr.getmaxyx.return_value = (24, 80)
+    ImportCommand()._handle(stdscr, read_csv_chunks, str(filename), chunk_size=10)
+
+    assert db_session.query(RawCleanedValue).count() == 25
+    stdscr.addstr.assert_called_with(12, 0, "Successfully imported 25 rows.")
+
+    aggregator = Aggregator()
+    aggregator.period_length = 1
+    assert aggregator.refresh_windows(RawCleanedValue) == 2
+
+    ImportCommand()._handle(stdscr, read_csv_chunks, str(filename), drop_previous=True, chunk_size=10)
+
+    assert db_session.query(RawCleanedValue).count() == 25
+    assert db_session.query(AggregatedWindow).count() == 0
+    value = db_session.query(RawCleanedValue).filter(RawCleanedValue.pid == int(data.pid[0])).first()
+    assert value.dttm == pd.to_datetime(data.dttm[0], unit="s")
+    assert value.name == data.name[0]
+
+
+def test_import_command_parquet(db_session, process_info_factory, mocker, tmp_path):
+    pytest.importorskip("pyarrow")
+    from detector.collectors import ParquetCollector
+
+    directory = str(tmp_path / "segments")
+    collector = ParquetCollector(directory)
+    for i in range(3):
+        collector.collect(
+            pd.DataFrame(
+                [process_info_factory(dttm=1650023400.5 + i * 60, create_time=1650000000.25) for _ in range(4)],
+                columns=COLUMNS,
+            )
+        )
+    collector.flush()
+
+    chunks = list(read_parquet_chunks(directory, 5))
+    assert [len(chunk) for chunk, _ in chunks] == [5, 5, 2]
+    assert chunks[-1][1] == 1
+
+    stdscr = mocker.MagicMock()
+    stdscr.getmaxyx.return_value = (24, 80)
+    ImportCommand()._handle(stdscr, read_parquet_chunks, directory, chunk_size=5)
+
+    assert db_session.query(RawCleanedValue).count() == 12
+    assert db_session.query(RawCleanedValue).first().dttm == pd.to_datetime(1650023400.5, unit="s")
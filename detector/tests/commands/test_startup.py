@@ -0,0 +1,60 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+STARTUP_SCRIPT = """
+import json
+import sys
+import time
+
+started_at = time.perf_counter()
+
+from detector import Detector
+
+Detector().fetch_command(sys.argv[1])
+seconds = time.perf_counter() - started_at
+
+import psutil
+
+# The current RSS, the peak one of a forked process includes the memory of its parent.
+rss = psutil.Process().memory_info().rss / (1024 * 1024)
+print(json.dumps({"seconds": seconds, "rss_mb": rss, "modules": sorted(sys.modules)}))
+"""
+
+HEAVY_MODULES = {"IPython", "curses", "flask", "matplotlib", "scipy", "seaborn"}
+
+# Commands are imported in about 0.5 seconds, the bound leaves room for slow CI machines.
+STARTUP_SECONDS_LIMIT = 1
+# Commands start at about 115 MB with pandas, SQLAlchemy and psutil, importing scipy and matplotlib
+# takes them over 180 MB.
+STARTUP_RSS_LIMIT_MB = 160
+
+
+def measure_startup(subcommand: str) -> tuple[float, float, set[str]]:
+    output = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT, subcommand], capture_output=True, check=True, text=True
+    ).stdout
+    result = json.loads(output.splitlines()[-1])
+    return result["seconds"], result["rss_mb"], {module.split(".")[0] for module in result["modules"]}
+
+
+@pytest.mark.parametrize(
+    "subcommand, allowed",
+    [
+        ("collect", set()),
+        ("detect", set()),
+        ("backtest", set()),
+        ("import", {"curses"}),
+        ("retention", set()),
+        ("shell", {"IPython"}),
+    ],
+)
+def test_command_startup(subcommand, allowed):
+    seconds, rss_mb, modules = measure_startup(subcommand)
+    print(f"{subcommand}: {seconds * 1000:.0f} ms, {rss_mb:.0f} MB")
+
+    assert modules & HEAVY_MODULES <= allowed
+    assert seconds < STARTUP_SECONDS_LIMIT
+    assert rss_mb < STARTUP_RSS_LIMIT_MB
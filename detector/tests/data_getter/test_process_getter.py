@@ -4,6 +4,7 @@ import pytest
 from pandas import Timestamp
 
 from detector.data_getter import ProcessGetter
+from detector.data_getter.process_getter import ATTRS, EXPENSIVE_ATTRS, STATIC_ATTRS
 
 
 @pytest.fixture
@@ -11,6 +12,7 @@ def patched_process(mocker):
     process = mocker.patch("detector.data_getter.process_getter.ps.Process", autoscope=True)
     process.return_value = process
     process.name.return_value = "Parent name"
+    process.is_running.return_value = True
     process.info = {
         "pid": 2,
         "name": "Name",
@@ -28,15 +30,13 @@ def patched_process(mocker):
         "ppid": 1,
         "open_files": ["file1", "file2"],
     }
+    process.as_dict.side_effect = lambda attrs, ad_value: {attr: process.info[attr] for attr in attrs}
     return process
 
 
 @pytest.fixture
-def patched_process_iter(mocker, patched_process):
-    return mocker.patch(
-        "detector.data_getter.process_getter.ps.process_iter",
-        return_value=[patched_process, mocker.Mock(info={"pid": 10})],
-    )
+def patched_pids(mocker, patched_process):
+    return mocker.patch("detector.data_getter.process_getter.ps.pids", return_value=[2, 10])
 
 
 @pytest.fixture
@@ -46,33 +46,16 @@ def patched_current_thread(mocker):
     )
 
 
-def test_process_getter(patched_process, patched_process_iter, patched_current_thread):
+def test_process_getter(patched_process, patched_pids, patched_current_thread):
     process_getter = ProcessGetter()
 
     assert process_getter._current_pid == 10
 
     dttm, data = process_getter.get_data()
 
-    patched_process_iter.assert_called_once_with(
-        [
-            "pid",
-            "name",
-            "username",
-            "terminal",
-            "num_threads",
-            "nice",
-            "exe",
-            "memory_percent",
-            "cmdline",
-            "create_time",
-            "connections",
-            "status",
-            "cpu_percent",
-            "ppid",
-            "open_files",
-        ]
-    )
-    patched_process.assert_called_once_with(1)
+    patched_pids.assert_called_once_with()
+    assert sorted(attr for call in patched_process.as_dict.call_args_list for attr in call.args[0]) == sorted(ATTRS)
+    assert [call.args for call in patched_process.call_args_list] == [(2,), (1,)]
 
     assert isinstance(dttm, datetime)
 
@@ -101,11 +84,10 @@ def test_process_getter(patched_process, patched_process_iter, patched_current_t
     assert str(process_getter) == "ProcessGetter"
 
 
-def test_no_parent(patched_process, patched_process_iter, patched_current_thread):
+def test_no_parent(patched_process, patched_pids, patched_current_thread):
     process_getter = ProcessGetter()
 
-    patched_process.reset_mock()
-    patched_process.side_effect = ValueError
+    patched_process.name.side_effect = ValueError
 
     dttm, data = process_getter.get_data()
 
@@ -133,3 +115,44 @@ def test_no_parent(patched_process, patched_process_iter, patched_current_thread
             "open_files": 2,
         }
     ]
+
+
+def test_expensive_attrs_interval(mocker, patched_process, patched_pids, patched_current_thread):
+    process_getter = ProcessGetter(expensive_attrs_interval=3)
+
+    _, data = process_getter.get_data()
+    assert data[["connections", "open_files"]].values.tolist() == [[1, 2]]
+
+    patched_process.as_dict.reset_mock()
+    _, data = process_getter.get_data()
+    assert data[["connections", "open_files"]].values.tolist() == [[1, 2]]
+    assert [set(call.args[0]) for call in patched_process.as_dict.call_args_list] == [
+        set(ATTRS) - set(STATIC_ATTRS) - set(EXPENSIVE_ATTRS)
+    ]
+
+    patched_pids.return_value = [3]
+    patched_process.info = {**patched_process.info, "pid": 3, "connections": [], "open_files": ["file1"]}
+    patched_process.is_running.return_value = False
+    patched_process.as_dict.reset_mock()
+    _, data = process_getter.get_data()
+    assert data[["pid", "connections", "open_files"]].values.tolist() == [[3, 0, 1]]
+    assert [set(call.args[0]) for call in patched_process.as_dict.call_args_list] == [
+        set(STATIC_ATTRS),
+        set(ATTRS) - set(STATIC_ATTRS),
+    ]
+
+
+def test_process_handles(patched_process, patched_pids, patched_current_thread):
+    process_getter = ProcessGetter()
+
+    process_getter.get_data()
+    process_getter.get_data()
+
+    assert [call.args for call in patched_process.call_args_list] == [(2,), (1,), (1,)]
+    assert [call.args[0] for call in patched_process.as_dict.call_args_list].count(STATIC_ATTRS) == 1
+    assert list(process_getter._handles) == [2]
+
+    patched_pids.return_value = [10]
+    process_getter.get_data()
+
+    assert process_getter._handles == {}
@@ -0,0 +1,116 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from detector.data_getter import ProcessGetter, ProcFSGetter
+from detector.data_getter.process_getter import COLUMNS
+
+
+def write_process(procfs, pid, name, ppid, state="S", utime=100, uid=0, cmdline=b"", fds=()):
+    path = procfs / str(pid)
+    (path / "fd").mkdir(parents=True)
+    fields = [state, ppid, 0, 0, 0, 0, 0, 0, 0, 0, 0, utime, 50, 0, 0, 20, 5, 3, 0, 1000, 0, 256]
+    (path / "stat").write_text(f"{pid} ({name}) {' '.join(map(str, fields))} 0 0\n")
+    (path / "status").write_text(f"Name:\t{name}\nUid:\t{uid}\t{uid}\t{uid}\t{uid}\n")
+    (path / "cmdline").write_bytes(cmdline)
+    for i, target in enumerate(fds):
+        os.symlink(target, path / "fd" / str(i))
+
+
+@pytest.fixture
+def procfs(tmp_path):
+    procfs = tmp_path / "proc"
+    (procfs / "net").mkdir(parents=True)
+    (procfs / "stat").write_text("cpu 1 2 3\nbtime 1660000000\n")
+    (procfs / "meminfo").write_text("MemTotal:       1000 kB\n")
+    (procfs / "net" / "tcp").write_text(
+        "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+        "   0: 0100007F:1F90 00000000:0000 0A 00000000:00000000 00:00000000 00000000  0  0 12345 1\n"
+    )
+    open_file = tmp_path / "open.txt"
+    open_file.write_text("")
+
+    write_process(procfs, 1, "init", 0, cmdline=b"/sbin/init\x00")
+    write_process(
+        procfs,
+        20,
+        "a-very-long-nam",
+        1,
+        state="R",
+        cmdline=b"/usr/bin/a-very-long-name\x00--flag\x00",
+        fds=["socket:[12345]", "socket:[99]", str(open_file), "pipe:[1]"],
+    )
+    write_process(procfs, 30, "kworker", 2, state="I")
+    return procfs
+
+
+def test_procfs_getter(procfs, mocker):
+    mocker.patch("detector.data_getter.procfs_getter.os.sysconf", side_effect=lambda name: 100)
+    mocker.patch("detector.data_getter.procfs_getter.time.monotonic", side_effect=[10.0, 11.0, 12.0, 11.0, 12.0, 13.0])
+
+    process_getter = ProcFSGetter(procfs_path=str(procfs))
+    dttm, data = process_getter.get_data()
+
+    assert str(process_getter) == "ProcFSGetter"
+    assert list(data.columns) == COLUMNS
+    assert data.pid.tolist() == [1, 20, 30]
+    assert data.name.tolist() == ["init", "a-very-long-name", "kworker"]
+    assert data.parent_name.tolist() == [0, "init", 0]
+    assert data.cmdline.tolist() == ["/sbin/init", "/usr/bin/a-very-long-name --flag", 0]
+    assert data.status.tolist() == ["sleeping", "running", "idle"]
+    assert data.connections.tolist() == [0, 1, 0]
+    assert data.open_files.tolist() == [0, 1, 0]
+    assert data.num_threads.tolist() == [3, 3, 3]
+    assert data.nice.tolist() == [5, 5, 5]
+    assert data.username.tolist() == ["root"] * 3
+    assert data.exe.tolist() == ["", "", ""]
+    assert data.create_time.tolist() == [1660000010.0] * 3
+    assert data.memory_percent.tolist() == [256 * 100 / 1024000 * 100] * 3
+    assert data.cpu_percent.tolist() == [0.0] * 3
+
+    write_stat = (procfs / "20" / "stat").read_text().split()
+    write_stat[13] = "150"
+    (procfs / "20" / "stat").write_text(" ".join(write_stat))
+
+    _, data = process_getter.get_data()
+    assert data.cpu_percent.tolist() == [0.0, 50.0, 0.0]
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="procfs is Linux only")
+def test_procfs_getter_matches_process_getter():
+    child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    try:
+        _, expected = ProcessGetter().get_data()
+        _, data = ProcFSGetter().get_data()
+    finally:
+        child.kill()
+        child.wait()
+
+    expected = expected.set_index("pid").loc[[child.pid, os.getppid()]]
+    data = data.set_index("pid").loc[[child.pid, os.getppid()]]
+    columns = ["name", "username", "ppid", "parent_name", "num_threads", "nice", "cmdline", "exe", "terminal", "status"]
+
+    assert data[columns].equals(expected[columns])
+    assert data.connections.equals(expected.connections)
+    assert data.open_files.equals(expected.open_files)
+    assert (data.create_time - expected.create_time).abs().max() < 0.1
+
+
+def test_procfs_getter_expensive_attrs_interval(procfs, tmp_path):
+    process_getter = ProcFSGetter(2, procfs_path=str(procfs))
+
+    _, data = process_getter.get_data()
+    assert data.connections.tolist() == [0, 1, 0]
+
+    os.symlink("socket:[12345]", procfs / "1" / "fd" / "0")
+    write_process(procfs, 40, "new", 1, fds=["socket:[12345]", str(tmp_path / "open.txt")])
+
+    _, data = process_getter.get_data()
+    assert data.pid.tolist() == [1, 20, 30, 40]
+    assert data.connections.tolist() == [0, 1, 0, 1]
+    assert data.open_files.tolist() == [0, 1, 0, 1]
+
+    _, data = process_getter.get_data()
+    assert data.connections.tolist() == [1, 1, 0, 1]
@@ -0,0 +1,111 @@
+import re
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+from sqlalchemy import desc, event
+
+from detector.aggregator import Aggregator
+from detector.db import AnomalyLog, RawValue, bulk_insert, session_scope
+from detector.settings import DB_PREFIX
+
+pytestmark = pytest.mark.skipif("sqlite" not in DB_PREFIX, reason="EXPLAIN QUERY PLAN is SQLite specific")
+
+DTTM = datetime(2022, 4, 15, 11, 50)
+SNAPSHOTS = 200
+PROCESSES = 50
+
+
+@pytest.fixture
+def synthetic_data(db_session):
+    dttms = [DTTM + timedelta(minutes=i) for i in range(SNAPSHOTS)]
+    data = pd.DataFrame(
+        [
+            {
+                "dttm": dttm,
+                "pid": pid,
+                "name": f"process{pid}",
+                "username": f"user{pid % 5}",
+                "cpu_percent": pid % 7,
+                "memory_percent": pid % 3,
+                "num_threads": pid % 4,
+                "status": "running" if pid % 2 else "sleeping",
+                "create_time": DTTM,
+                "connections": pid % 2,
+                "open_files": pid % 5,
+            }
+            for dttm in dttms
+            for pid in range(PROCESSES)
+        ]
+    )
+    with session_scope() as session:
+        bulk_insert(session, RawValue, data)
+        bulk_insert(session, AnomalyLog, pd.DataFrame({"dttm": dttms, "reason": "{}"}))
+    return dttms
+
+
+@contextmanager
+def capture_statements(connection):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(connection.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(connection.engine, "before_cursor_execute", before_cursor_execute)
+
+
+def closest_raw_values(dttms: list[datetime]) -> list:
+    # The same query as the closest_raw_values endpoint of the web app.
+    dttm = dttms[-1]
+    with session_scope() as session:
+        return (
+            session.query(RawValue)
+            .filter(RawValue.dttm > dttm - timedelta(minutes=Aggregator.period_length), RawValue.dttm <= dttm)
+            .order_by(desc(RawValue.dttm))
+            .all()
+        )
+
+
+def anomaly_list(dttms: list[datetime]) -> list:
+    # The same query as the anomaly_list endpoint of the web app.
+    with session_scope() as session:
+        return session.query(AnomalyLog).order_by(desc(AnomalyLog.dttm)).all()
+
+
+HOT_QUERIES = {
+    "detect_windows": (lambda dttms: Aggregator().get_detect_data(dttms[-1]), "ix_raw_values_dttm_pid_username"),
+    "train_windows": (lambda dttms: Aggregator().get_windows(dttms[10:], RawValue), "ix_raw_values_dttm_pid_username"),
+    "dttms": (lambda dttms: Aggregator().get_dttms(RawValue, dttm_to=dttms[-1]), "ix_raw_values_dttm_pid_username"),
+    "closest_raw_values": (closest_raw_values, "ix_raw_values_dttm_pid_username"),
+    "anomaly_list": (anomaly_list, "ix_anomaly_logs_dttm"),
+}
+
+
+@pytest.mark.parametrize("name", list(HOT_QUERIES))
+def test_query_plans(db_connection, synthetic_data, name):
+    func, index = HOT_QUERIES[name]
+    with capture_statements(db_connection) as statements:
+        started_at = time.perf_counter()
+        func(synthetic_data)
+        seconds = time.perf_counter() - started_at
+
+    plans = []
+    for statement, parameters in statements:
+        plan = db_connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+        # The literal rows of the windows are left out of the printed plan.
+        plans.append([row[-1] for row in plan if row[-1] not in ("SCAN CONSTANT ROW", "UNION ALL", "COMPOUND QUERY")])
+    print(f"{name}: {seconds * 1000:.1f} ms", *[line for plan in plans for line in plan], sep="\n    ")
+
+    # Every statement reading the table searches the index, none of them scans the whole table or sorts it.
+    table = "anomaly_logs" if name == "anomaly_list" else "raw_values"
+    lines = [line for plan in plans for line in plan if re.search(rf"\b{table}\b", line)]
+    assert lines
+    assert all(index in line for line in lines), lines
+    assert not any(line == f"SCAN {table}" for line in lines), lines
+    assert not any("TEMP B-TREE FOR ORDER BY" in line for plan in plans for line in plan if name != "train_windows")
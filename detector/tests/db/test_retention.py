@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import MetaData, insert, text
+
+from detector.aggregator import Aggregator
+from detector.db import AggregatedWindow, RawCleanedValue, RawValue, RawValueRollup
+from detector.db.retention import (
+    _partitioned_table,
+    apply_retention,
+    create_partitions,
+    create_tables,
+    get_partitions,
+    is_partitioned,
+)
+from detector.settings import DB_PREFIX
+
+
+def test_apply_retention(db_session, raw_value_factory, raw_value_cleaned_factory):
+    now = datetime(2022, 4, 18, 11, 50)
+    day_start = datetime(2022, 4, 15)
+    for day in range(4):
+        for minute in range(2):
+            dttm = day_start + timedelta(days=day, minutes=minute, seconds=30)
+            for pid in range(3):
+                raw_value_factory(
+                    dttm=dttm,
+                    pid=pid,
+                    username="root",
+                    name="bash" if pid else "init",
+                    cpu_percent=pid * 10 + minute,
+                    memory_percent=1.0,
+                    num_threads=pid,
+                    connections=2,
+                    open_files=4,
+                )
+    raw_value_cleaned_factory(dttm=day_start)
+
+    # Two whole days before today are kept, the rows of 2022-04-15 are rolled up.
+    rollups, removed = apply_retention(RawValue, 2, now=now)
+
+    assert (rollups, removed) == (4, 6)
+    assert db_session.query(RawValue).count() == 18
+    assert db_session.query(RawValue).filter(RawValue.dttm < datetime(2022, 4, 16)).count() == 0
+    assert db_session.query(RawCleanedValue).count() == 1
+
+    rollup = (
+        db_session.query(RawValueRollup)
+        .filter(RawValueRollup.dttm == day_start + timedelta(minutes=1), RawValueRollup.name == "bash")
+        .one()
+    )
+    assert rollup.source == "raw_values"
+    assert rollup.username == "root"
+    assert rollup.processes == 2
+    assert rollup.cpu_percent_avg == pytest.approx(16)
+    assert rollup.cpu_percent_max == pytest.approx(21)
+    assert rollup.num_threads_avg == pytest.approx(1.5)
+    assert rollup.open_files_avg == pytest.approx(4)
+
+    assert apply_retention(RawValue, 2, now=now) == (0, 0)
+    assert db_session.query(RawValueRollup).count() == 4
+
+
+def test_apply_retention_keeps_windows(db_session, raw_value_cleaned_factory):
+    day_start = datetime(2022, 4, 15)
+    for day in range(3):
+        for minute in range(3):
+            raw_value_cleaned_factory(dttm=day_start + timedelta(days=day, minutes=minute), pid=1, cpu_percent=minute)
+
+    aggregator = Aggregator()
+    aggregator.period_length = 1
+    assert aggregator.refresh_windows(RawCleanedValue) == 8
+    windows = aggregator.load_windows(RawCleanedValue)
+
+    # The rows of the first two days are rolled up, the windows computed from them are kept as they are.
+    assert apply_retention(RawCleanedValue, 0, now=datetime(2022, 4, 17, 12))[1] == 6
+    assert aggregator.refresh_windows(RawCleanedValue) == 0
+    assert db_session.query(AggregatedWindow).count() == 8
+    assert aggregator.load_windows(RawCleanedValue).equals(windows)
+
+    raw_value_cleaned_factory(dttm=day_start + timedelta(days=2, minutes=3), pid=1, cpu_percent=3)
+    assert aggregator.refresh_windows(RawCleanedValue) == 1
+    assert db_session.query(AggregatedWindow).count() == 9
+
+
+@pytest.mark.skipif("sqlite" in DB_PREFIX, reason="Partitions are PostgreSQL specific")
+def test_create_partitions_moves_default_rows(db_session):  # pragma: no cover
+    class PartitionedValue:
+        __tablename__ = "partitioned_values"
+
+    table = _partitioned_table(RawValue.__table__).to_metadata(MetaData(), name=PartitionedValue.__tablename__)
+    table.create(db_session.connection())
+    db_session.execute(text("CREATE TABLE partitioned_values_default PARTITION OF partitioned_values DEFAULT"))
+    db_session.execute(insert(table), [{"dttm": datetime(2022, 4, 15, 10)}, {"dttm": datetime(2022, 4, 16, 10)}])
+
+    # The rows of 2022-04-15 are already in the default partition, they are moved to the created one.
+    create_partitions(db_session, PartitionedValue, datetime(2022, 4, 15), datetime(2022, 4, 15, 12))
+    create_partitions(db_session, PartitionedValue, datetime(2022, 4, 15), datetime(2022, 4, 15, 12))
+
+    assert list(get_partitions(db_session, PartitionedValue)) == ["partitioned_values_p20220415"]
+    assert db_session.execute(text("SELECT count(*) FROM partitioned_values_p20220415")).scalar() == 1
+    assert db_session.execute(text("SELECT count(*) FROM partitioned_values_default")).scalar() == 1
+    assert db_session.execute(text("SELECT count(*) FROM partitioned_values")).scalar() == 2
+
+
+@pytest.mark.skipif("sqlite" in DB_PREFIX, reason="Partitions are PostgreSQL specific")
+def test_create_tables_keeps_unpartitioned_tables(db_session, raw_value_factory):  # pragma: no cover
+    # The test database has plain raw values tables, like installations created before partitioning.
+    raw_value_factory(dttm=datetime(2022, 4, 15, 10))
+    assert not is_partitioned(db_session, RawValue)
+
+    create_tables(db_session.connection())
+
+    assert not is_partitioned(db_session, RawValue)
+    assert db_session.execute(text("SELECT to_regclass('raw_values_default')")).scalar() is None
+    assert db_session.query(RawValue).count() == 1
@@ -0,0 +1,26 @@
+import threading
+
+from detector.detect_process import DetectProcess
+from detector.detect_process.pipeline import Pipeline, Stage
+
+
+def test_stop_skips_flush_of_stalled_collect_stage(mocker):
+    release = threading.Event()
+    collect_stage = Stage("collect", lambda item: release.wait())
+    detect_process = DetectProcess.__new__(DetectProcess)
+    detect_process._verbose = False
+    detect_process._collector = mocker.MagicMock()
+    detect_process._collect_stage = collect_stage
+    detect_process._pipeline = Pipeline([collect_stage])
+    detect_process._pipeline.start()
+    collect_stage.put(1)
+
+    # The stalled stage still owns the collector buffer after the timeout.
+    detect_process.stop(0.1)
+    assert collect_stage.is_alive()
+    detect_process._collector.flush.assert_not_called()
+
+    release.set()
+    collect_stage.join()
+    detect_process.stop(1)
+    detect_process._collector.flush.assert_called_once()
@@ -0,0 +1,89 @@
+import threading
+import time
+
+from detector.detect_process.pipeline import Pipeline, Stage
+
+
+def test_pipeline_drains_on_stop():
+    results = []
+    log_stage = Stage("log", results.append, maxsize=100)
+    double_stage = Stage("double", lambda x: x * 2, maxsize=100, next_stage=log_stage)
+    pipeline = Pipeline([double_stage, log_stage])
+    pipeline.start()
+
+    for i in range(50):
+        assert double_stage.put(i)
+    pipeline.stop()
+
+    assert results == [i * 2 for i in range(50)]
+    assert not double_stage.is_alive()
+    assert not log_stage.is_alive()
+
+
+def test_stage_drops_when_full():
+    started, release = threading.Event(), threading.Event()
+    results = []
+
+    def slow(item):
+        started.set()
+        release.wait()
+        results.append(item)
+
+    stage = Stage("slow", slow, maxsize=1, block=False)
+    stage.start()
+    assert stage.put(0)
+    started.wait()
+    assert stage.put(1)
+    assert not stage.put(2)
+    assert stage.dropped == 1
+    release.set()
+    stage.stop()
+
+    assert results == [0, 1]
+
+
+def test_stage_survives_exceptions(capsys):
+    results = []
+
+    def func(item):
+        if item == 1:
+            raise ValueError("Broken item")
+        results.append(item)
+
+    stage = Stage("func", func, maxsize=10)
+    stage.start()
+    for i in range(3):
+        stage.put(i)
+    stage.stop()
+
+    assert results == [0, 2]
+    assert stage.failed == 1
+    assert "Broken item" in capsys.readouterr().err
+
+
+def test_stage_stop_timeout():
+    started, release = threading.Event(), threading.Event()
+    results = []
+
+    def stalled(item):
+        started.set()
+        release.wait()
+        results.append(item)
+
+    stage = Stage("stalled", stalled, maxsize=1)
+    stage.start()
+    stage.put(0)
+    started.wait()
+    stage.put(1)
+
+    # The queue is full and the worker is stalled, stop returns after the timeout and drops the queued item.
+    started_at = time.monotonic()
+    stage.stop(timeout=0.2)
+    assert time.monotonic() - started_at < 1
+    assert stage.dropped == 1
+    assert stage.is_alive()
+
+    release.set()
+    stage.join(1)
+    assert not stage.is_alive()
+    assert results == [0]
@@ -1,9 +1,11 @@
 from detector import Detector
-from detector.db import Base, Session, get_engine
+from detector.db import Session, get_engine
+from detector.db.retention import create_tables
 
 if __name__ == "__main__":
     engine = get_engine()
-    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        create_tables(connection)
     Session.configure(bind=engine)
 
     detector = Detector()